@@ -0,0 +1,213 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse
+from django.urls import path
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+
+from recipes.ingredient_index import ingredient_index
+from recipes.models import Ingredient
+
+from .conditional import (
+    ingredients_etag,
+    ingredients_last_modified,
+    recipe_etag,
+    recipe_last_modified,
+    recipe_state
+)
+from .relations import FAVORITES, SHOPPING_CART, SUBSCRIPTIONS, get_relations
+from .views import IngredientFilter
+
+# Асинхронные версии читающих эндпоинтов для запуска под ASGI. Они
+# обрабатывают обычные GET-запросы, а все прочее (записи, ошибки,
+# browsable API) отдают синхронным представлениям DRF. Правила доступа,
+# фильтры, пагинация и кэш берутся у тех же вьюсетов, чтобы ответы не
+# расходились.
+
+renderer = JSONRenderer()
+
+
+def initialize_view(sync_view, request, **kwargs):
+    # Вьюсет собирается так же, как в as_view() роутера, а аутентификацию,
+    # права, троттлинг и согласование формата выполняет сам DRF в
+    # initial(). None означает, что запрос должен обработать синхронный
+    # вид: он же вернет 401 или 403.
+    view = sync_view.cls(**sync_view.initkwargs)
+    view.action_map = sync_view.actions
+    view.args = ()
+    view.kwargs = kwargs
+    view.request = view.initialize_request(request, **kwargs)
+    view.headers = view.default_response_headers
+    try:
+        view.initial(view.request, **kwargs)
+    except (APIException, Http404):
+        return None
+    return view
+
+
+def json_response(data, **headers):
+    return HttpResponse(
+        renderer.render(data),
+        content_type=renderer.media_type,
+        headers=headers
+    )
+
+
+def async_read_view(fast_path, sync_view):
+
+    @csrf_exempt
+    async def view(request, **kwargs):
+        response = None
+        if (
+            request.method == 'GET'
+            and 'format' not in request.GET
+            and 'text/html' not in request.headers.get('Accept', '')
+        ):
+            drf_view = await sync_to_async(initialize_view)(
+                sync_view, request, **kwargs
+            )
+            if drf_view is not None:
+                response = await fast_path(drf_view, **kwargs)
+        if response is None:
+            return await sync_to_async(sync_view)(request, **kwargs)
+        # Как finalize_response в DRF.
+        patch_vary_headers(response, ['Accept'])
+        return response
+
+    return view
+
+
+@condition(
+    etag_func=ingredients_etag,
+    last_modified_func=ingredients_last_modified
+)
+async def list_ingredients(request):
+    name = request.GET.get('name')
+    if settings.INGREDIENT_SEARCH_IN_MEMORY:
+        if name:
+            data = await sync_to_async(ingredient_index.search)(name)
+        else:
+            data = await sync_to_async(ingredient_index.all)()
+        return json_response(data)
+    queryset = Ingredient.objects.all()
+    if name:
+        queryset = IngredientFilter().filter_by_name(queryset, 'name', name)
+    return json_response([
+        ingredient async for ingredient in queryset.values(
+            'id', 'name', 'measurement_unit'
+        )
+    ])
+
+
+async def ingredient_list(view):
+    return await list_ingredients(view.request)
+
+
+async def ingredient_detail(view, pk):
+    try:
+        ingredient = await Ingredient.objects.values(
+            'id', 'name', 'measurement_unit'
+        ).aget(pk=pk)
+    except Ingredient.DoesNotExist:
+        return None
+    return json_response(ingredient)
+
+
+async def serialize_recipes(view, recipes, many=False):
+    await get_relations(view.request).apreload(
+        FAVORITES, SHOPPING_CART, SUBSCRIPTIONS
+    )
+    return view.get_serializer(recipes, many=many).data
+
+
+async def cached_json(view, build):
+    # Тот же кэш ответов анонимам и те же ключи, что у синхронного вида.
+    if view.request.user.is_authenticated:
+        data = await build()
+        return None if data is None else json_response(data)
+    key, data = await sync_to_async(view.cache_lookup)(view.request)
+    if data is not None:
+        return json_response(data, **{'X-Cache': 'HIT'})
+    data = await build()
+    if data is None:
+        return None
+    await cache.aset(key, data, settings.RESPONSE_CACHE_TIMEOUT)
+    return json_response(data, **{'X-Cache': 'MISS'})
+
+
+def paginate_recipes(view):
+    return view.paginate_queryset(view.filter_queryset(view.get_queryset()))
+
+
+async def recipe_list(view):
+
+    async def build():
+        try:
+            recipes = await sync_to_async(paginate_recipes)(view)
+        except (APIException, Http404):
+            return None
+        return view.get_paginated_response(
+            await serialize_recipes(view, recipes, many=True)
+        ).data
+
+    return await cached_json(view, build)
+
+
+@condition(etag_func=recipe_etag, last_modified_func=recipe_last_modified)
+async def render_recipe(request, pk):
+    view = request.parser_context['view']
+
+    async def build():
+        try:
+            recipe = await sync_to_async(view.get_object)()
+        except Http404:
+            return None
+        return await serialize_recipes(view, recipe)
+
+    response = await cached_json(view, build)
+    if response is None:
+        raise Http404
+    return response
+
+
+async def recipe_detail(view, pk):
+    # Состояние рецепта и множества связей читаются заранее, тогда
+    # ETag и Last-Modified считаются теми же функциями, что в синхронном
+    # retrieve, без запросов к базе, и 304 отдается до сериализации.
+    if await sync_to_async(recipe_state)(view.request, pk) is None:
+        return None
+    await get_relations(view.request).apreload(
+        FAVORITES, SHOPPING_CART, SUBSCRIPTIONS
+    )
+    try:
+        response = await render_recipe(view.request, pk)
+    except Http404:
+        return None
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+def async_urlpatterns(router):
+    views = {url.name: url.callback for url in router.urls}
+    return [
+        path(
+            'ingredients/',
+            async_read_view(ingredient_list, views['ingredients-list'])
+        ),
+        path(
+            'ingredients/<int:pk>/',
+            async_read_view(ingredient_detail, views['ingredients-detail'])
+        ),
+        path(
+            'recipes/',
+            async_read_view(recipe_list, views['recipes-list'])
+        ),
+        path(
+            'recipes/<int:pk>/',
+            async_read_view(recipe_detail, views['recipes-detail'])
+        ),
+    ]
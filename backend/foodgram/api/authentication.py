@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.permissions import SAFE_METHODS
+
+token_cache_stats = Counter()
+
+
+def token_cache_key(key):
+    return f'auth:token:{key}'
+
+
+class TokenCache:
+    # Соответствие токена и id пользователя: LRU в памяти процесса поверх
+    # общего кэша Django. Сброс при выходе или смене пароля удаляет ключ
+    # в общем кэше и в памяти своего процесса, а в остальных процессах
+    # токен продолжает действовать для читающих запросов, пока не
+    # истечет локальная запись, то есть до TOKEN_CACHE_LOCAL_TIMEOUT
+    # секунд.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                user_id, expires = entry
+                if expires > time.monotonic():
+                    self.entries.move_to_end(key)
+                    token_cache_stats['local_hit'] += 1
+                    return user_id
+                del self.entries[key]
+        user_id = cache.get(token_cache_key(key))
+        if user_id is None:
+            token_cache_stats['miss'] += 1
+            return None
+        token_cache_stats['shared_hit'] += 1
+        self.remember(key, user_id)
+        return user_id
+
+    def set(self, key, user_id):
+        cache.set(
+            token_cache_key(key), user_id, settings.TOKEN_CACHE_TIMEOUT
+        )
+        self.remember(key, user_id)
+
+    def remember(self, key, user_id):
+        expires = time.monotonic() + settings.TOKEN_CACHE_LOCAL_TIMEOUT
+        with self.lock:
+            self.entries[key] = (user_id, expires)
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.TOKEN_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+        cache.delete_many([token_cache_key(key) for key in keys])
+
+
+token_cache = TokenCache()
+
+
+def cached_user(user_id):
+    # Загружен только id, остальные поля читаются из базы при первом
+    # обращении к ним.
+    User = get_user_model()
+    return User.from_db(User.objects.db, ['id'], [user_id])
+
+
+def hit_rate():
+    total = sum(token_cache_stats.values())
+    if not total:
+        return None
+    return (
+        token_cache_stats['local_hit'] + token_cache_stats['shared_hit']
+    ) / total
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    # Читающие запросы берут пользователя из кэша без запроса к базе.
+    # Записи проверяют токен по базе: они могут сохранить пользователя
+    # целиком, и закэшированные счетчики затерли бы актуальные.
+    cached = False
+
+    def authenticate(self, request):
+        self.cached = request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def authenticate_credentials(self, key):
+        if not self.cached:
+            return super().authenticate_credentials(key)
+        user_id = token_cache.get(key)
+        if user_id is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, user.pk)
+            return user, token
+        user = cached_user(user_id)
+        return user, Token(key=key, user=user)
@@ -0,0 +1,123 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from recipes.counters import COUNTERS, reconcile
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Subscription
+)
+from recipes.search import refresh_ingredient_ids
+
+User = get_user_model()
+
+BATCH_SIZE = 2000
+SEED_EMAIL = 'benchmark0@foodgram.local'
+
+
+def generate(users=50, recipes=500, ingredients_per_recipe=10,
+             favorite_density=0.05, subscription_density=0.1,
+             cart_size=20, seed=1):
+    # Данные детерминированы seed, чтобы прогоны были сравнимы между
+    # собой и с сохраненным baseline.
+    rng = random.Random(seed)
+    ingredients = Ingredient.objects.bulk_create(
+        (
+            Ingredient(
+                name=f'benchmark ингредиент {idx}',
+                measurement_unit=rng.choice(('г', 'мл', 'шт.'))
+            )
+            for idx in range(max(ingredients_per_recipe * 10, 100))
+        ),
+        batch_size=BATCH_SIZE
+    )
+    authors = User.objects.bulk_create(
+        (
+            User(
+                email=f'benchmark{idx}@foodgram.local',
+                username=f'benchmark{idx}',
+                first_name='Benchmark',
+                last_name=str(idx),
+                password='!',
+            )
+            for idx in range(users)
+        ),
+        batch_size=BATCH_SIZE
+    )
+    created_recipes = Recipe.objects.bulk_create(
+        (
+            Recipe(
+                # Первый рецепт принадлежит пользователю, от имени
+                # которого идут замеры, чтобы его можно было обновлять.
+                author=authors[0] if idx == 0 else rng.choice(authors),
+                name=f'Benchmark рецепт {idx}',
+                text='Синтетический рецепт для замеров',
+                cooking_time=rng.randint(1, 120),
+                image='recipes/images/benchmark.png',
+            )
+            for idx in range(recipes)
+        ),
+        batch_size=BATCH_SIZE
+    )
+    RecipeIngredient.objects.bulk_create(
+        (
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=ingredient,
+                amount=rng.randint(1, 500),
+            )
+            for recipe in created_recipes
+            for ingredient in rng.sample(ingredients, ingredients_per_recipe)
+        ),
+        batch_size=BATCH_SIZE
+    )
+    refresh_ingredient_ids([recipe.pk for recipe in created_recipes])
+    Favorite.objects.bulk_create(
+        (
+            Favorite(user=user, recipe=recipe)
+            for user in authors
+            for recipe in created_recipes
+            if rng.random() < favorite_density
+        ),
+        batch_size=BATCH_SIZE
+    )
+    Subscription.objects.bulk_create(
+        (
+            Subscription(user=user, author=author)
+            for user in authors
+            for author in authors
+            if user != author and rng.random() < subscription_density
+        ),
+        batch_size=BATCH_SIZE
+    )
+    ShoppingCart.objects.bulk_create(
+        (
+            ShoppingCart(user=authors[0], recipe=recipe)
+            for recipe in rng.sample(
+                created_recipes, min(cart_size, len(created_recipes))
+            )
+        ),
+        batch_size=BATCH_SIZE
+    )
+    for model, field, related_model, related_field in COUNTERS:
+        reconcile(model, field, related_model, related_field, BATCH_SIZE)
+    return {
+        'user': authors[0],
+        'recipe': created_recipes[0],
+        'ingredients': ingredients,
+    }
+
+
+def seed(**options):
+    # Данные для нагрузочного теста остаются в базе: сервер читает их из
+    # другого процесса. Повторный вызов переиспользует созданные данные.
+    user = User.objects.filter(email=SEED_EMAIL).first()
+    if user is None:
+        with transaction.atomic():
+            user = generate(**options)['user']
+    return user
@@ -0,0 +1,150 @@
+import base64
+import io
+import tempfile
+import time
+import tracemalloc
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+METRICS = ('p50_ms', 'p90_ms', 'p99_ms', 'queries', 'peak_allocated_bytes')
+
+
+def image_data_uri():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), 'orange').save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = max(0, round(percent / 100 * len(values)) - 1)
+    return values[index]
+
+
+def scenarios(data):
+    recipe = data['recipe']
+    ingredients = data['ingredients']
+    image = image_data_uri()
+    counter = iter(range(10 ** 9))
+
+    def recipe_body(offset):
+        return {
+            'name': f'Benchmark новый рецепт {offset}',
+            'text': 'Замер записи',
+            'cooking_time': 10,
+            'image': image,
+            'ingredients': [
+                {'id': ingredient.id, 'amount': offset % 7 + 1}
+                for ingredient in ingredients[offset % 5:offset % 5 + 10]
+            ],
+        }
+
+    return {
+        'recipes_list': lambda client: client.get('/api/recipes/'),
+        'recipe_detail': lambda client: client.get(
+            f'/api/recipes/{recipe.id}/'
+        ),
+        'recipes_search': lambda client: client.get(
+            '/api/recipes/?search=синтетический рецепт'
+        ),
+        'recipes_by_ingredients': lambda client: client.get(
+            f'/api/recipes/?ingredients={ingredients[0].id},'
+            f'{ingredients[1].id}&match=any'
+            f'&exclude_ingredients={ingredients[2].id}'
+        ),
+        'subscriptions': lambda client: client.get(
+            '/api/users/subscriptions/?recipes_limit=3'
+        ),
+        'download_shopping_cart': lambda client: client.get(
+            '/api/recipes/download_shopping_cart/'
+        ),
+        'ingredients_search': lambda client: client.get(
+            '/api/ingredients/?name=benchmark ингредиент 1'
+        ),
+        'recipe_create': lambda client: client.post(
+            '/api/recipes/', recipe_body(next(counter)), format='json'
+        ),
+        'recipe_update': lambda client: client.patch(
+            f'/api/recipes/{recipe.id}/',
+            recipe_body(next(counter)),
+            format='json'
+        ),
+    }
+
+
+def consume(response):
+    if response.status_code >= 400:
+        raise AssertionError(
+            f'{response.status_code}: {getattr(response, "data", "")}'
+        )
+    if response.streaming:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(response.content)
+
+
+def run_scenario(client, request, iterations, warmup):
+    for _ in range(warmup):
+        consume(request(client))
+    timings = []
+    queries = 0
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            consume(request(client))
+            timings.append((time.perf_counter() - started) * 1000)
+        queries = max(queries, len(context.captured_queries))
+    # Выделения памяти меряются отдельным прогоном: tracemalloc
+    # заметно замедляет код и исказил бы задержки.
+    tracemalloc.start()
+    consume(request(client))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'iterations': iterations,
+        'mean_ms': sum(timings) / len(timings),
+        'p50_ms': percentile(timings, 50),
+        'p90_ms': percentile(timings, 90),
+        'p99_ms': percentile(timings, 99),
+        'queries': queries,
+        'peak_allocated_bytes': peak,
+    }
+
+
+def run(data, iterations=30, warmup=3, only=None):
+    client = APIClient()
+    client.force_authenticate(data['user'])
+    results = {}
+    with tempfile.TemporaryDirectory() as media_root, override_settings(
+        ALLOWED_HOSTS=['*'], MEDIA_ROOT=media_root
+    ):
+        for name, request in scenarios(data).items():
+            if only and name not in only:
+                continue
+            results[name] = run_scenario(client, request, iterations, warmup)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, metrics in results.items():
+        expected = baseline.get('scenarios', {}).get(name)
+        if expected is None:
+            continue
+        for metric in METRICS:
+            if metric not in expected:
+                continue
+            # Число запросов детерминировано, любой рост — регрессия.
+            allowed = expected[metric] * (
+                1 if metric == 'queries' else 1 + tolerance
+            )
+            if metrics[metric] > allowed:
+                regressions.append(
+                    f'{name}.{metric}: {metrics[metric]:.2f} > '
+                    f'{expected[metric]:.2f}'
+                )
+    return regressions
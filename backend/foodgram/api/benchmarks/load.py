@@ -0,0 +1,101 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .endpoints import percentile
+
+# Нагрузочный тест против запущенного сервера: несколько клиентов
+# параллельно ходят по списку адресов, а мы считаем пропускную
+# способность и задержки на каждом уровне конкуренции.
+
+# Анонимные списки и поиск ингредиентов после прогрева отдаются из
+# кэша без запросов к базе, поэтому по умолчанию ходим от имени
+# пользователя (--token или --seed) по адресам, которые читают базу.
+DEFAULT_PATHS = (
+    '/api/recipes/',
+    '/api/recipes/?is_in_shopping_cart=1',
+    '/api/users/subscriptions/',
+    '/api/users/me/',
+)
+
+
+def client(base_url, paths, headers, deadline, offset):
+    latencies = []
+    errors = 0
+    index = offset
+    with requests.Session() as session:
+        while time.perf_counter() < deadline:
+            url = base_url + paths[index % len(paths)]
+            index += 1
+            started = time.perf_counter()
+            try:
+                response = session.get(url, headers=headers, timeout=30)
+            except requests.RequestException:
+                errors += 1
+                continue
+            if response.status_code >= 400:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+    return latencies, errors
+
+
+def run_level(base_url, paths, concurrency, duration, headers):
+    started = time.perf_counter()
+    deadline = started + duration
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(
+            lambda offset: client(
+                base_url, paths, headers, deadline, offset
+            ),
+            range(concurrency)
+        ))
+    elapsed = time.perf_counter() - started
+    latencies = [value for values, _ in results for value in values]
+    result = {
+        'requests': len(latencies),
+        'errors': sum(errors for _, errors in results),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+    }
+    for percent in (50, 90, 99):
+        result[f'p{percent}_ms'] = (
+            round(percentile(latencies, percent), 2) if latencies else None
+        )
+    return result
+
+
+def run(base_url, paths=DEFAULT_PATHS, levels=(1, 10, 50), duration=10,
+        token=None):
+    base_url = base_url.rstrip('/')
+    headers = {'Authorization': f'Token {token}'} if token else {}
+    # Прогрев: первые запросы наполняют кэши и пулы соединений.
+    client(base_url, paths, headers, time.perf_counter() + 1, 0)
+    return {
+        str(concurrency): run_level(
+            base_url, paths, concurrency, duration, headers
+        )
+        for concurrency in levels
+    }
+
+
+def compare(results, baseline):
+    lines = []
+    for concurrency, metrics in results.items():
+        expected = baseline.get('levels', {}).get(concurrency)
+        if not expected or not expected['throughput_rps']:
+            continue
+        ratio = metrics['throughput_rps'] / expected['throughput_rps']
+        line = (
+            f'{concurrency} клиентов: {metrics["throughput_rps"]} rps '
+            f'против {expected["throughput_rps"]} rps (x{ratio:.2f})'
+        )
+        for percent in (50, 99):
+            metric = f'p{percent}_ms'
+            if metrics[metric] is not None and expected[metric] is not None:
+                line += (
+                    f', p{percent} {metrics[metric]} мс '
+                    f'против {expected[metric]} мс'
+                )
+        lines.append(line)
+    return lines
@@ -0,0 +1,126 @@
+import resource
+import time
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.db.models import Sum
+
+from api.shopping_list import ShoppingList, ShoppingListTextRenderer
+from recipes.models import Ingredient, Recipe, RecipeIngredient, ShoppingCart
+
+User = get_user_model()
+
+
+def create_cart(recipes_count, ingredients_per_recipe):
+    user = User.objects.create_user(
+        email='benchmark@foodgram.local',
+        username='benchmark',
+        first_name='Benchmark',
+        last_name='User',
+    )
+    ingredients = Ingredient.objects.bulk_create(
+        Ingredient(name=f'benchmark ingredient {idx}', measurement_unit='г')
+        for idx in range(ingredients_per_recipe * 2)
+    )
+    recipes = Recipe.objects.bulk_create(
+        Recipe(
+            author=user,
+            name=f'Benchmark recipe {idx}',
+            text='Benchmark',
+            cooking_time=1,
+            image='recipes/images/benchmark.png',
+        )
+        for idx in range(recipes_count)
+    )
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(
+            recipe=recipe,
+            ingredient=ingredients[(idx + offset) % len(ingredients)],
+            amount=offset + 1,
+        )
+        for idx, recipe in enumerate(recipes)
+        for offset in range(ingredients_per_recipe)
+    )
+    ShoppingCart.objects.bulk_create(
+        ShoppingCart(user=user, recipe=recipe) for recipe in recipes
+    )
+    return user
+
+
+def build_report(user):
+    # Реализация до перехода на потоковую выгрузку: весь отчет собирается
+    # в одну строку перед отправкой ответа.
+    cart_ingredients = RecipeIngredient.objects.filter(
+        recipe__shopping_carts__user=user
+    )
+    totals = cart_ingredients.values(
+        'ingredient__name',
+        'ingredient__measurement_unit'
+    ).annotate(total_amount=Sum('amount')).order_by('ingredient__name')
+    usages = cart_ingredients.values_list(
+        'ingredient__name',
+        'recipe__name',
+        'recipe__author__username'
+    ).order_by('recipe_id')
+    recipes_in_cart = Recipe.objects.filter(
+        shopping_carts__user=user
+    ).values_list('name', 'author__username').order_by('id')
+
+    ingredient_recipes = {}
+    for ingredient_name, recipe_name, username in usages:
+        ingredient_recipes.setdefault(ingredient_name, {})[
+            f"{recipe_name} (автор: {username})"
+        ] = None
+
+    shopping_list = [
+        f"{idx}. {item['ingredient__name'].capitalize()}"
+        f" - {item['total_amount']} {item['ingredient__measurement_unit']}"
+        f" (для рецептов: "
+        f"{', '.join(ingredient_recipes[item['ingredient__name']])})"
+        for idx, item in enumerate(totals, start=1)
+    ]
+    return '\n'.join([
+        'Отчет по списку покупок',
+        'Продукты:',
+        'Список покупок (составлено: ...):',
+        *shopping_list,
+        'Рецепты в корзине:',
+        *(f"{name} (автор: {username})" for name, username in recipes_in_cart)
+    ]).encode()
+
+
+def stream_report(user):
+    return ShoppingListTextRenderer().stream(ShoppingList(user))
+
+
+def measure(produce):
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    started = time.perf_counter()
+    first_byte = None
+    size = 0
+    for chunk in produce():
+        if first_byte is None:
+            first_byte = time.perf_counter() - started
+        size += len(chunk)
+    total = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'time_to_first_byte': first_byte,
+        'total_time': total,
+        'peak_allocated_bytes': peak,
+        'max_rss_growth_kb': (
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+        ),
+        'response_bytes': size,
+    }
+
+
+def run(user):
+    return {
+        # Потоковая версия измеряется первой, чтобы рост max RSS
+        # не маскировался пиком от сборки строки целиком.
+        'streaming': measure(lambda: stream_report(user)),
+        'joined_string': measure(lambda: [build_report(user)]),
+    }
@@ -0,0 +1,73 @@
+import hashlib
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from recipes.versions import (
+    INGREDIENTS_VERSION,
+    POPULARITY_VERSION,
+    RECIPES_VERSION,
+    author_recipes_version,
+    get_version
+)
+
+from .conditional import recipe_etag
+
+response_cache_stats = Counter()
+
+
+class AnonymousResponseCacheMixin:
+    def get_response_cache_key(self, request):
+        # Счетчики избранного и подписчиков меняются с каждым кликом и
+        # не сбрасывают общую версию. Общий список показывает их с
+        # задержкой до RESPONSE_CACHE_TIMEOUT, а ключ рецепта строится
+        # из того же состояния, что и ETag, включая счетчики автора.
+        author = request.query_params.get('author')
+        if self.action == 'list' and author and author.isdigit():
+            recipes_version = get_version(author_recipes_version(author))
+        else:
+            recipes_version = get_version(RECIPES_VERSION)
+        if self.action == 'retrieve':
+            etag = recipe_etag(request, self.kwargs['pk'])
+            recipes_version = f'{recipes_version}.{etag}'
+        if 'popularity' in request.query_params.get('ordering', ''):
+            recipes_version = (
+                f'{recipes_version}.{get_version(POPULARITY_VERSION)}'
+            )
+        url_hash = hashlib.md5(
+            request.build_absolute_uri().encode()
+        ).hexdigest()
+        return (
+            f'response:{self.basename}:{self.action}:{recipes_version}:'
+            f'{get_version(INGREDIENTS_VERSION)}:{url_hash}'
+        )
+
+    def cache_lookup(self, request):
+        key = self.get_response_cache_key(request)
+        data = cache.get(key)
+        response_cache_stats['miss' if data is None else 'hit'] += 1
+        return key, data
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+
+        key, data = self.cache_lookup(request)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
@@ -0,0 +1,60 @@
+import hashlib
+
+from recipes.models import Recipe
+from recipes.versions import INGREDIENTS_VERSION, get_modified, get_version
+
+from .relations import FAVORITES, SHOPPING_CART, SUBSCRIPTIONS, get_relations
+
+
+def ingredients_etag(request, *args, **kwargs):
+    return f'"ingredients-{get_version(INGREDIENTS_VERSION)}"'
+
+
+def ingredients_last_modified(request, *args, **kwargs):
+    return get_modified(INGREDIENTS_VERSION)
+
+
+def recipe_state(request, pk):
+    if hasattr(request, '_recipe_state'):
+        return request._recipe_state
+
+    request._recipe_state = Recipe.objects.filter(pk=pk).values(
+        'updated_at',
+        'favorites_count',
+        'image_variants',
+        'author__email',
+        'author__username',
+        'author__first_name',
+        'author__last_name',
+        'author__avatar',
+        'author__recipes_count',
+        'author__subscribers_count',
+        'author_id',
+    ).first()
+    return request._recipe_state
+
+
+def recipe_etag(request, pk):
+    state = recipe_state(request, pk)
+    if state is None:
+        return None
+    relations = get_relations(request)
+    fingerprint = repr((
+        sorted(state.items()),
+        relations.contains(FAVORITES, int(pk)),
+        relations.contains(SHOPPING_CART, int(pk)),
+        relations.contains(SUBSCRIPTIONS, state['author_id']),
+        request.user.pk,
+        get_version(INGREDIENTS_VERSION),
+    ))
+    return '"recipe-%s"' % hashlib.md5(fingerprint.encode()).hexdigest()
+
+
+def recipe_last_modified(request, pk):
+    # Для авторизованных пользователей ответ зависит от избранного и
+    # корзины, которые не меняют updated_at, поэтому сверяемся только
+    # по ETag.
+    if request.user.is_authenticated:
+        return None
+    state = recipe_state(request, pk)
+    return state and state['updated_at']
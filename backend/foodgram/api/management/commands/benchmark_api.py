@@ -0,0 +1,106 @@
+import json
+import platform
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.benchmarks import data, endpoints
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет горячие эндпоинты API на синтетических данных: '
+        'перцентили задержки, число запросов и пиковые выделения памяти. '
+        'Данные создаются в транзакции и откатываются после замеров.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--recipes', type=int, default=500)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=10)
+        parser.add_argument('--favorite-density', type=float, default=0.05)
+        parser.add_argument(
+            '--subscription-density', type=float, default=0.1
+        )
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--only',
+            nargs='+',
+            help='Запустить только перечисленные сценарии.'
+        )
+        parser.add_argument('--output', help='Сохранить результаты в JSON.')
+        parser.add_argument(
+            '--baseline',
+            help='JSON прошлого прогона, с которым сравнивать результаты.'
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.2,
+            help='Допустимое ухудшение времени и памяти (доля).'
+        )
+
+    def handle(self, *args, **options):
+        parameters = {
+            name: options[name]
+            for name in (
+                'users',
+                'recipes',
+                'ingredients_per_recipe',
+                'favorite_density',
+                'subscription_density',
+                'iterations',
+                'seed',
+            )
+        }
+        with transaction.atomic():
+            dataset = data.generate(
+                users=options['users'],
+                recipes=options['recipes'],
+                ingredients_per_recipe=options['ingredients_per_recipe'],
+                favorite_density=options['favorite_density'],
+                subscription_density=options['subscription_density'],
+                seed=options['seed']
+            )
+            scenarios = endpoints.run(
+                dataset,
+                iterations=options['iterations'],
+                warmup=options['warmup'],
+                only=options['only']
+            )
+            transaction.set_rollback(True)
+
+        results = {
+            'environment': {
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+            },
+            'parameters': parameters,
+            'scenarios': scenarios,
+        }
+        report = json.dumps(results, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(report)
+        self.stdout.write(report)
+
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)
+            if baseline.get('parameters') != parameters:
+                self.stderr.write(
+                    'Параметры baseline отличаются от текущего прогона'
+                )
+            regressions = endpoints.compare(
+                scenarios, baseline, options['tolerance']
+            )
+            if regressions:
+                raise CommandError(
+                    'Регрессии относительно baseline:\n'
+                    + '\n'.join(regressions)
+                )
+            self.stdout.write(self.style.SUCCESS('Регрессий не найдено'))
@@ -0,0 +1,28 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.benchmarks import shopping_list
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает потоковую выгрузку списка покупок с выгрузкой '
+        'одной строкой: время до первого байта, общее время и память.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=200)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = shopping_list.create_cart(
+                options['recipes'],
+                options['ingredients_per_recipe']
+            )
+            results = shopping_list.run(user)
+            transaction.set_rollback(True)
+
+        self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,85 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from api.benchmarks import data, load
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает запущенный сервер параллельными клиентами и считает '
+        'пропускную способность и задержки. Позволяет сравнить режимы '
+        'сервера (WSGI и ASGI, пул соединений и без него): сохраните '
+        'прогон одного и передайте его в --baseline при прогоне другого.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument(
+            '--paths', nargs='+', default=list(load.DEFAULT_PATHS)
+        )
+        parser.add_argument(
+            '--concurrency', nargs='+', type=int, default=[1, 10, 50],
+            help='Уровни конкуренции (число одновременных клиентов).'
+        )
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Длительность каждого уровня в секундах.'
+        )
+        parser.add_argument(
+            '--token', help='Токен для запросов от имени пользователя.'
+        )
+        parser.add_argument(
+            '--seed', action='store_true',
+            help='Создать синтетические данные benchmark_api в базе, если '
+                 'их еще нет, и ходить от имени их первого пользователя.'
+        )
+        parser.add_argument(
+            '--label', default='', help='Метка прогона, например asgi.'
+        )
+        parser.add_argument('--output', help='Сохранить результаты в JSON.')
+        parser.add_argument(
+            '--baseline',
+            help='JSON прошлого прогона, с которым сравнить пропускную '
+                 'способность.'
+        )
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            options['token'] = Token.objects.get_or_create(
+                user=data.seed()
+            )[0].key
+        if not options['token'] and options['paths'] == list(
+            load.DEFAULT_PATHS
+        ):
+            raise CommandError(
+                'Адреса по умолчанию доступны только авторизованным: '
+                'передайте --token или --seed.'
+            )
+        results = {
+            'label': options['label'],
+            'url': options['url'],
+            'paths': options['paths'],
+            'duration': options['duration'],
+            'levels': load.run(
+                options['url'],
+                paths=options['paths'],
+                levels=options['concurrency'],
+                duration=options['duration'],
+                token=options['token']
+            ),
+        }
+        report = json.dumps(results, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(report)
+        self.stdout.write(report)
+
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)
+            if baseline.get('label'):
+                self.stdout.write(f'Сравнение с {baseline["label"]}:')
+            for line in load.compare(results['levels'], baseline):
+                self.stdout.write(line)
@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+def estimated_count(queryset):
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql' or queryset.query.where:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [queryset.model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    # До первого ANALYZE reltuples равен -1.
+    if row is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+class EstimatedCountPaginator(Paginator):
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if (
+            estimate is not None
+            and estimate >= settings.PAGINATION_ESTIMATED_COUNT_THRESHOLD
+        ):
+            return estimate
+        return super().count
+
+
+class KeysetPagination(CursorPagination):
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = 50
+    ordering = '-id'
+
+    def get_ordering(self, request, queryset, view):
+        # Ключ курсора всегда -id, даже если запрошена ?ordering=.
+        return (self.ordering,)
+
+
+class StandardResultsSetPagination(PageNumberPagination):
+    page_size = 6
+    page_size_query_param = 'limit'
+    page_query_param = "page"
+    max_page_size = 50
+    django_paginator_class = EstimatedCountPaginator
+    cursor_query_param = 'cursor'
+    keyset_pagination = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params:
+            return super().paginate_queryset(queryset, request, view)
+        self.keyset_pagination = KeysetPagination()
+        return self.keyset_pagination.paginate_queryset(
+            queryset, request, view
+        )
+
+    def get_paginated_response(self, data):
+        if self.keyset_pagination is not None:
+            return self.keyset_pagination.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def to_html(self):
+        if self.keyset_pagination is not None:
+            return self.keyset_pagination.to_html()
+        return super().to_html()
@@ -0,0 +1,264 @@
+import hmac
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse, HttpResponseForbidden
+
+from .authentication import token_cache_stats
+from .cache import response_cache_stats
+
+logger = logging.getLogger(__name__)
+
+IN_LIST = re.compile(r'\bIN \([^()]*\)')
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+SAVEPOINTS = re.compile(r'"s\d+_x\d+"')
+
+METRICS = (
+    ('requests_total', 'Число обработанных запросов'),
+    ('queries_total', 'Число SQL-запросов'),
+    ('duplicate_queries_total', 'Повторы одинаковых SQL-запросов (N+1)'),
+    ('db_seconds_total', 'Время в базе данных'),
+    ('serialization_seconds_total', 'Время сериализации и рендеринга'),
+    ('duration_seconds_total', 'Полное время обработки запроса'),
+    ('response_bytes_total', 'Размер ответов'),
+    ('slow_requests_total', 'Запросы дольше порога'),
+)
+
+
+def fingerprint(sql):
+    sql = SAVEPOINTS.sub('?', sql)
+    sql = IN_LIST.sub('IN (...)', LITERALS.sub('?', sql))
+    return ' '.join(sql.split())
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.fingerprints = Counter()
+        self.db_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def count(self):
+        return sum(self.fingerprints.values())
+
+    def duplicates(self):
+        return {
+            sql: count for sql, count in self.fingerprints.items()
+            if count >= settings.QUERY_PROFILING_DUPLICATE_THRESHOLD
+        }
+
+
+class RequestProfile:
+    def __init__(self):
+        self.recorder = QueryRecorder()
+        self.serialization_time = 0.0
+        self.action = None
+
+    def timed(self, func):
+        # Из времени сериализации вычитаются запросы, которые она
+        # вызвала: они уже учтены во времени базы данных.
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            db_time = self.recorder.db_time
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.serialization_time += (
+                    time.perf_counter() - started
+                    - (self.recorder.db_time - db_time)
+                )
+        return wrapper
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.actions = defaultdict(Counter)
+
+    def record(self, action, **values):
+        with self.lock:
+            self.actions[action].update(values)
+
+    def render(self):
+        with self.lock:
+            actions = {
+                action: dict(values)
+                for action, values in self.actions.items()
+            }
+        lines = []
+        for name, help_text in METRICS:
+            metric = f'foodgram_api_{name}'
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} counter')
+            for action, values in sorted(actions.items()):
+                lines.append(
+                    f'{metric}{{action="{action}"}} {values.get(name, 0)}'
+                )
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def render_cache_stats():
+    metric = 'foodgram_api_cache_lookups_total'
+    lines = [
+        f'# HELP {metric} Обращения к кэшам ответов и токенов',
+        f'# TYPE {metric} counter',
+    ]
+    for name, stats in (
+        ('response', response_cache_stats),
+        ('token', token_cache_stats),
+    ):
+        for result, value in sorted(stats.items()):
+            lines.append(
+                f'{metric}{{cache="{name}",result="{result}"}} {value}'
+            )
+    return '\n'.join(lines) + '\n'
+
+
+def render_pool_stats():
+    # Пул есть только у PostgreSQL с OPTIONS['pool'] (DATABASE_POOL).
+    pool = getattr(connection, 'pool', None)
+    if pool is None:
+        return ''
+    metric = 'foodgram_api_db_pool'
+    lines = [
+        f'# HELP {metric} Состояние пула соединений psycopg',
+        f'# TYPE {metric} gauge',
+    ]
+    for name, value in sorted(pool.get_stats().items()):
+        lines.append(f'{metric}{{stat="{name}"}} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def get_profile(request):
+    return getattr(getattr(request, '_request', request), 'profile', None)
+
+
+class QueryProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        request.profile = profile
+        started = time.perf_counter()
+        with connection.execute_wrapper(profile.recorder):
+            response = self.get_response(request)
+        self.report(request, response, profile, time.perf_counter() - started)
+        return response
+
+    def report(self, request, response, profile, duration):
+        action = profile.action
+        if action is None:
+            match = request.resolver_match
+            action = match.view_name if match else 'unresolved'
+        recorder = profile.recorder
+        duplicates = recorder.duplicates()
+        slow = duration * 1000 >= settings.QUERY_PROFILING_SLOW_MS
+        metrics.record(
+            action,
+            requests_total=1,
+            queries_total=recorder.count,
+            duplicate_queries_total=sum(duplicates.values()) - len(duplicates),
+            db_seconds_total=recorder.db_time,
+            serialization_seconds_total=profile.serialization_time,
+            duration_seconds_total=duration,
+            response_bytes_total=(
+                0 if response.streaming else len(response.content)
+            ),
+            slow_requests_total=int(slow),
+        )
+        if duplicates:
+            logger.warning(
+                'Повторяющиеся запросы в %s %s:\n%s',
+                request.method,
+                request.get_full_path(),
+                '\n'.join(
+                    f'  x{count} {sql}'
+                    for sql, count in duplicates.items()
+                )
+            )
+        if slow:
+            logger.warning(
+                'Медленный запрос %s %s (%s): %.0f мс, %s SQL за %.0f мс, '
+                'сериализация %.0f мс\n%s',
+                request.method,
+                request.get_full_path(),
+                action,
+                duration * 1000,
+                recorder.count,
+                recorder.db_time * 1000,
+                profile.serialization_time * 1000,
+                '\n'.join(
+                    f'  x{count} {sql}'
+                    for sql, count in recorder.fingerprints.most_common()
+                )
+            )
+
+
+class QueryProfilingMixin:
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        profile = get_profile(request)
+        if profile is not None:
+            profile.action = (
+                f'{type(self).__name__}.'
+                f'{getattr(self, "action", None) or request.method.lower()}'
+            )
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        profile = get_profile(self.request)
+        if profile is not None:
+            serializer.to_representation = profile.timed(
+                serializer.to_representation
+            )
+        return serializer
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        profile = get_profile(request)
+        if profile is not None and not getattr(
+            response, 'is_rendered', True
+        ):
+            response.render = profile.timed(response.render)
+        return response
+
+
+def has_metrics_access(request):
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    header = request.headers.get('Authorization', '').split()
+    return bool(
+        settings.METRICS_TOKEN
+        and len(header) == 2
+        and header[0].lower() == 'bearer'
+        and hmac.compare_digest(header[1], settings.METRICS_TOKEN)
+    )
+
+
+def metrics_view(request):
+    # Счетчики живут в памяти процесса: при нескольких воркерах опрос
+    # видит данные только того воркера, который его обработал.
+    if not has_metrics_access(request):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        metrics.render() + render_cache_stats() + render_pool_stats(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -0,0 +1,128 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from recipes.models import Favorite, ShoppingCart, Subscription
+
+FAVORITES = 'favorites'
+SHOPPING_CART = 'shopping_cart'
+SUBSCRIPTIONS = 'subscriptions'
+
+RELATIONS = {
+    FAVORITES: (Favorite, 'recipe_id'),
+    SHOPPING_CART: (ShoppingCart, 'recipe_id'),
+    SUBSCRIPTIONS: (Subscription, 'author_id'),
+}
+
+
+def relations_cache_key(user_id, name):
+    return f'relations:{name}:{user_id}'
+
+
+class UserRelations:
+    # Множества id избранного, корзины и подписок пользователя. Каждое
+    # читается одним запросом при первом обращении и живет в кэше, так
+    # что флаги в ответах проверяются без запросов к базе.
+
+    def __init__(self, user):
+        self.user = user
+        self._ids = {}
+        self._changed = set()
+
+    def ids(self, name):
+        if not self.user.is_authenticated:
+            return frozenset()
+        if name not in self._ids:
+            key = relations_cache_key(self.user.pk, name)
+            ids = None if name in self._changed else cache.get(key)
+            if ids is None:
+                ids = frozenset(self._queryset(name))
+                if name not in self._changed:
+                    cache.set(key, ids, settings.RELATIONS_CACHE_TIMEOUT)
+            self._ids[name] = ids
+        return self._ids[name]
+
+    def _queryset(self, name):
+        model, field = RELATIONS[name]
+        return model.objects.filter(user=self.user).values_list(
+            field, flat=True
+        )
+
+    async def apreload(self, *names):
+        # Асинхронные представления заранее читают множества, чтобы
+        # сериализатор потом проверял флаги без обращений к базе.
+        if not self.user.is_authenticated:
+            return
+        for name in names:
+            if name in self._ids:
+                continue
+            key = relations_cache_key(self.user.pk, name)
+            ids = await cache.aget(key)
+            if ids is None:
+                ids = frozenset([pk async for pk in self._queryset(name)])
+                await cache.aset(key, ids, settings.RELATIONS_CACHE_TIMEOUT)
+            self._ids[name] = ids
+
+    def contains(self, name, pk):
+        return pk in self.ids(name)
+
+    def invalidate(self, name):
+        # До коммита изменение видно только этому запросу, поэтому
+        # до конца запроса множество читается из базы в обход кэша.
+        self._ids.pop(name, None)
+        self._changed.add(name)
+        key = relations_cache_key(self.user.pk, name)
+        transaction.on_commit(lambda: cache.delete(key))
+
+
+def get_relations(request):
+    http_request = getattr(request, '_request', request)
+    relations = getattr(http_request, '_relations', None)
+    if relations is None or relations.user != request.user:
+        relations = UserRelations(request.user)
+        http_request._relations = relations
+    return relations
+
+
+def add_relation(name, user_id, target_id):
+    # Один INSERT без предварительных SELECT. Строка выбирается из
+    # таблицы цели, поэтому для несуществующей цели ничего не вставится,
+    # а ON CONFLICT DO NOTHING делает повторный запрос безопасным.
+    # Возвращает True, если связь действительно добавлена.
+    model, field = RELATIONS[name]
+    relation = model._meta.get_field(field)
+    target = relation.target_field
+    quote_name = connection.ops.quote_name
+    columns = [model._meta.get_field('user').column, relation.column]
+    values = ['%s', quote_name(target.column)]
+    params = [user_id]
+    for model_field in model._meta.concrete_fields:
+        if getattr(model_field, 'auto_now_add', False):
+            columns.append(model_field.column)
+            values.append('%s')
+            params.append(
+                model_field.get_db_prep_save(timezone.now(), connection)
+            )
+    params.append(target.get_prep_value(target_id))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote_name(model._meta.db_table)} '
+            f'({", ".join(map(quote_name, columns))}) '
+            f'SELECT {", ".join(values)} '
+            f'FROM {quote_name(target.model._meta.db_table)} '
+            f'WHERE {quote_name(target.column)} = %s '
+            f'ON CONFLICT DO NOTHING '
+            f'RETURNING {quote_name(model._meta.pk.column)}',
+            params
+        )
+        return cursor.fetchone() is not None
+
+
+def remove_relation(name, user_id, target_id):
+    # У моделей связей нет сигналов удаления, так что Django удаляет
+    # одним DELETE без предварительной выборки.
+    model, field = RELATIONS[name]
+    return bool(model.objects.filter(
+        user_id=user_id, **{field: target_id}
+    ).delete()[0])
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from recipes.counters import change_counter
 from recipes.models import (
     Recipe,
     RecipeIngredient,
@@ -8,8 +9,24 @@ from recipes.models import (
 )
 from django.contrib.auth import get_user_model
 from djoser.serializers import UserSerializer as DjoserUserSerializer
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import (
+    InMemoryUploadedFile,
+    TemporaryUploadedFile
+)
+from django.db import transaction
+from .relations import (
+    FAVORITES,
+    SHOPPING_CART,
+    SUBSCRIPTIONS,
+    get_relations
+)
 import base64
+import binascii
+import io
+
+BASE64_CHUNK_SIZE = 64 * 1024
 
 
 User = get_user_model()
@@ -26,18 +43,61 @@ class IngredientSerializer(serializers.ModelSerializer):
         )
 
 
+def decode_base64_file(imgstr, name, content_type):
+    # Декодируем порциями, кратными 4 символам, чтобы не держать в памяти
+    # вторую полную копию картинки; большие файлы сразу пишем на диск.
+    if len(imgstr) // 4 * 3 > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+        file = TemporaryUploadedFile(name, content_type, 0, None)
+    else:
+        file = InMemoryUploadedFile(
+            io.BytesIO(), None, name, content_type, 0, None
+        )
+    for start in range(0, len(imgstr), BASE64_CHUNK_SIZE):
+        file.write(base64.b64decode(
+            imgstr[start:start + BASE64_CHUNK_SIZE], validate=True
+        ))
+    file.size = file.tell()
+    file.seek(0)
+    return file
+
+
 class Base64ImageField(serializers.ImageField):
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(
-                base64.b64decode(imgstr),
-                name=f"avatar.{ext}"
-            )
+            content_type = format[len('data:'):]
+            ext = content_type.split('/')[-1]
+            try:
+                data = decode_base64_file(
+                    imgstr, f"avatar.{ext}", content_type
+                )
+            except binascii.Error:
+                self.fail('invalid_image')
         return super().to_internal_value(data)
 
 
+class ImageSrcsetField(serializers.Field):
+    def __init__(self, **kwargs):
+        kwargs['source'] = 'image_variants'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, variants):
+        request = self.context.get('request')
+        srcset = {}
+        for extension, widths in variants.items():
+            if extension == 'source':
+                continue
+            urls = []
+            for width, name in widths.items():
+                url = default_storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                urls.append(f'{url} {width}w')
+            srcset[extension] = ', '.join(urls)
+        return srcset
+
+
 class AvatarUploadSerializer(serializers.ModelSerializer):
     avatar = Base64ImageField()
 
@@ -65,24 +125,20 @@ class UserSerializer(DjoserUserSerializer):
     class Meta(DjoserUserSerializer.Meta):
         fields = DjoserUserSerializer.Meta.fields + (
             'is_subscribed',
-            'avatar'
+            'avatar',
+            'recipes_count',
+            'subscribers_count'
         )
         read_only_fields = fields
 
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        return (
-            user.is_authenticated
-            and user.author.filter(author=obj).exists()
+        return get_relations(self.context['request']).contains(
+            SUBSCRIPTIONS, obj.pk
         )
 
 
 class UserSubscriptionRecipeSerializer(UserSerializer):
     recipes = serializers.SerializerMethodField('get_recipes', read_only=True)
-    recipes_count = serializers.IntegerField(
-        source='recipes.count',
-        read_only=True
-    )
 
     class Meta:
         model = User
@@ -95,17 +151,14 @@ class UserSubscriptionRecipeSerializer(UserSerializer):
             'is_subscribed',
             'avatar',
             'recipes',
-            'recipes_count'
+            'recipes_count',
+            'subscribers_count'
         )
         read_only_fields = fields
 
     def get_recipes(self, obj):
         request = self.context.get('request')
-        recipes_queryset = obj.recipes.all()
-
-        limit = request.query_params.get("recipes_limit")
-        if limit and limit.isdigit():
-            recipes_queryset = recipes_queryset[:int(limit)]
+        recipes_queryset = obj.limited_recipes
 
         return RecipeShortSerializer(
             recipes_queryset,
@@ -115,10 +168,11 @@ class UserSubscriptionRecipeSerializer(UserSerializer):
 
 
 class RecipeShortSerializer(serializers.ModelSerializer):
+    image_srcset = ImageSrcsetField()
 
     class Meta:
         model = Recipe
-        fields = ("id", "name", "image", "cooking_time")
+        fields = ("id", "name", "image", "image_srcset", "cooking_time")
         read_only_fields = fields
 
 
@@ -137,17 +191,38 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
+class RecipeIngredientListSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        ingredients = Ingredient.objects.in_bulk(
+            {item['id'] for item in items}
+        )
+        unknown_ids = sorted(
+            {item['id'] for item in items} - ingredients.keys()
+        )
+        if unknown_ids:
+            raise serializers.ValidationError(
+                'Ингредиенты не найдены: '
+                + ', '.join(map(str, unknown_ids))
+            )
+        for item in items:
+            item['id'] = ingredients[item['id']]
+        return items
+
+
 class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
     amount = serializers.IntegerField(min_value=MIN_VALUE_INGREDIENTS_COUNT)
 
     class Meta:
         model = RecipeIngredient
         fields = ('id', 'amount')
+        list_serializer_class = RecipeIngredientListSerializer
 
 
 class RecipeSerializer(serializers.ModelSerializer):
     image = Base64ImageField(required=True, allow_null=False)
+    image_srcset = ImageSrcsetField()
     author = UserSerializer(read_only=True)
     ingredients = RecipeIngredientCreateSerializer(many=True, write_only=True)
     is_favorited = serializers.SerializerMethodField('get_is_favorited')
@@ -165,37 +240,31 @@ class RecipeSerializer(serializers.ModelSerializer):
                   'ingredients',
                   'name',
                   'image',
+                  'image_srcset',
                   'text',
                   'cooking_time',
                   'is_favorited',
-                  'is_in_shopping_cart')
-        read_only_fields = ["author"]
+                  'is_in_shopping_cart',
+                  'favorites_count')
+        read_only_fields = ["author", "favorites_count"]
 
     def get_is_favorited(self, obj):
-        user = self.context['request'].user
-        if user:
-            return (
-                user.is_authenticated
-                and user.favourites.filter(recipe__exact=obj).exists()
-            )
-        return False
+        return get_relations(self.context['request']).contains(
+            FAVORITES, obj.pk
+        )
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context['request'].user
-        if user:
-            return (
-                user.is_authenticated
-                and user.shop_carts.filter(recipe__exact=obj).exists()
-            )
-        return False
+        return get_relations(self.context['request']).contains(
+            SHOPPING_CART, obj.pk
+        )
 
     def validate(self, attrs):
-        ingredients = self.initial_data.get('ingredients')
+        ingredients = attrs.get('ingredients')
         if not ingredients:
             raise serializers.ValidationError(
                 'Список ингредиентов не должен быть пустым!.')
 
-        ingredients_ids = [ingredient['id']
+        ingredients_ids = [ingredient['id'].id
                            for ingredient in ingredients]
 
         if len(ingredients_ids) != len(set(ingredients_ids)):
@@ -204,27 +273,75 @@ class RecipeSerializer(serializers.ModelSerializer):
         return attrs
 
     def push_ingredients(self, recipe, ingredients):
-        recipe.recipe_ingredients.all().delete()
-
-        return RecipeIngredient.objects.bulk_create(
-            RecipeIngredient(
-                recipe=recipe,
-                ingredient=ingredient['id'],
-                amount=ingredient['amount']
-            )
+        # Сравниваем с текущим составом и трогаем только отличающиеся
+        # строки: при правке рецепта обычно меняется пара количеств.
+        existing = {
+            item.ingredient_id: item
+            for item in recipe.recipe_ingredients.all()
+        }
+        amounts = {
+            ingredient['id'].id: ingredient['amount']
             for ingredient in ingredients
-        )
+        }
+        added = [
+            ingredient_id for ingredient_id in amounts
+            if ingredient_id not in existing
+        ]
+        removed = [
+            ingredient_id for ingredient_id in existing
+            if ingredient_id not in amounts
+        ]
+        changed = []
+        for ingredient_id, item in existing.items():
+            amount = amounts.get(ingredient_id, item.amount)
+            if item.amount != amount:
+                item.amount = amount
+                changed.append(item)
+
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        if added:
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient_id=ingredient_id,
+                    amount=amounts[ingredient_id]
+                )
+                for ingredient_id in added
+            )
+            change_counter(
+                Ingredient.objects.filter(id__in=added), 'recipes_count', 1
+            )
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+            change_counter(
+                Ingredient.objects.filter(id__in=removed),
+                'recipes_count',
+                -1
+            )
+        if added or removed:
+            recipe.ingredient_ids = sorted(amounts)
+            Recipe.objects.filter(pk=recipe.pk).update(
+                ingredient_ids=recipe.ingredient_ids
+            )
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients_data = validated_data.pop('ingredients')
         validated_data['author'] = self.context['request'].user
         recipe = super().create(validated_data)
+        change_counter(
+            User.objects.filter(pk=recipe.author_id), 'recipes_count', 1
+        )
+        recipe.author.refresh_from_db(fields=['recipes_count'])
         self.push_ingredients(recipe, ingredients_data)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients_data = validated_data.pop('ingredients')
-        instance.recipe_ingredients.all().delete()
         self.push_ingredients(instance, ingredients_data)
 
         return super().update(instance, validated_data)
@@ -232,7 +349,14 @@ class RecipeSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         representation = super().to_representation(instance)
 
+        recipe_ingredients = instance.recipe_ingredients.all()
+        if 'recipe_ingredients' not in getattr(
+            instance, '_prefetched_objects_cache', {}
+        ):
+            recipe_ingredients = recipe_ingredients.select_related(
+                'ingredient'
+            )
         representation["ingredients"] = RecipeIngredientSerializer(
-            instance.recipe_ingredients.all(), many=True
+            recipe_ingredients, many=True
         ).data
         return representation
@@ -0,0 +1,171 @@
+import csv
+import io
+import json
+from datetime import datetime
+from itertools import groupby
+from operator import itemgetter
+
+from django.db.models import Sum
+from rest_framework.renderers import BaseRenderer
+
+from recipes.models import Recipe, RecipeIngredient
+
+CHUNK_SIZE = 500
+BUFFER_SIZE = 8192
+
+
+class ShoppingList:
+    def __init__(self, user, chunk_size=CHUNK_SIZE):
+        self.user = user
+        self.chunk_size = chunk_size
+        self.created = datetime.now()
+
+    def ingredients(self):
+        cart_ingredients = RecipeIngredient.objects.filter(
+            recipe__shopping_carts__user=self.user
+        )
+        totals = cart_ingredients.values(
+            'ingredient__name',
+            'ingredient__measurement_unit'
+        ).annotate(
+            total_amount=Sum('amount')
+        ).order_by('ingredient__name').iterator(chunk_size=self.chunk_size)
+        usages = groupby(
+            cart_ingredients.values_list(
+                'ingredient__name',
+                'recipe__name',
+                'recipe__author__username'
+            ).order_by(
+                'ingredient__name', 'recipe_id'
+            ).iterator(chunk_size=self.chunk_size),
+            key=itemgetter(0)
+        )
+
+        for item in totals:
+            _, rows = next(usages)
+            yield {
+                'name': item['ingredient__name'].capitalize(),
+                'amount': item['total_amount'],
+                'measurement_unit': item['ingredient__measurement_unit'],
+                'recipes': [(name, author) for _, name, author in rows],
+            }
+
+    def recipes(self):
+        return Recipe.objects.filter(
+            shopping_carts__user=self.user
+        ).values_list(
+            'name', 'author__username'
+        ).order_by('id').iterator(chunk_size=self.chunk_size)
+
+
+def recipe_title(name, author):
+    return f"{name} (автор: {author})"
+
+
+class ShoppingListRenderer(BaseRenderer):
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not isinstance(data, ShoppingList):
+            return json.dumps(data, ensure_ascii=False).encode(self.charset)
+        return b''.join(self.stream(data))
+
+    def stream(self, shopping_list):
+        chunks = self.iter_chunks(shopping_list)
+        yield next(chunks).encode(self.charset)
+        buffer = []
+        size = 0
+        for chunk in chunks:
+            buffer.append(chunk)
+            size += len(chunk)
+            if size >= BUFFER_SIZE:
+                yield ''.join(buffer).encode(self.charset)
+                buffer = []
+                size = 0
+        if buffer:
+            yield ''.join(buffer).encode(self.charset)
+
+    def iter_chunks(self, shopping_list):
+        raise NotImplementedError(
+            'ShoppingListRenderer.iter_chunks() must be implemented.'
+        )
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def iter_chunks(self, shopping_list):
+        date_str = shopping_list.created.strftime("%d.%m.%Y")
+        yield (
+            'Отчет по списку покупок\n'
+            'Продукты:\n'
+            f'Список покупок (составлено: {date_str}):'
+        )
+        for idx, item in enumerate(shopping_list.ingredients(), start=1):
+            recipes = ', '.join(
+                recipe_title(*recipe) for recipe in item['recipes']
+            )
+            yield (
+                f"\n{idx}. {item['name']} - {item['amount']}"
+                f" {item['measurement_unit']} (для рецептов: {recipes})"
+            )
+        yield '\nРецепты в корзине:'
+        for recipe in shopping_list.recipes():
+            yield f'\n{recipe_title(*recipe)}'
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def iter_chunks(self, shopping_list):
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(
+            ('Продукт', 'Количество', 'Единица измерения', 'Рецепты')
+        )
+        for item in shopping_list.ingredients():
+            writer.writerow((
+                item['name'],
+                item['amount'],
+                item['measurement_unit'],
+                '; '.join(
+                    recipe_title(*recipe) for recipe in item['recipes']
+                ),
+            ))
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+        yield output.getvalue()
+
+
+class ShoppingListJSONRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+    def iter_chunks(self, shopping_list):
+        yield '{"created": %s, "ingredients": [' % json.dumps(
+            shopping_list.created.isoformat()
+        )
+        for idx, item in enumerate(shopping_list.ingredients()):
+            item['recipes'] = [
+                {'name': name, 'author': author}
+                for name, author in item['recipes']
+            ]
+            yield (', ' if idx else '') + json.dumps(
+                item, ensure_ascii=False
+            )
+        yield '], "recipes": ['
+        for idx, (name, author) in enumerate(shopping_list.recipes()):
+            yield (', ' if idx else '') + json.dumps(
+                {'name': name, 'author': author}, ensure_ascii=False
+            )
+        yield ']}'
+
+
+SHOPPING_LIST_RENDERERS = [
+    ShoppingListTextRenderer,
+    ShoppingListCSVRenderer,
+    ShoppingListJSONRenderer,
+]
@@ -0,0 +1,41 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+
+User = get_user_model()
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    # Выход через djoser token/logout удаляет токен, сюда же попадает
+    # удаление пользователя. Ключ запоминаем сразу: после удаления Django
+    # обнуляет первичный ключ экземпляра.
+    key = instance.key
+    transaction.on_commit(lambda: token_cache.invalidate([key]))
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # В кэше лежит только id, поэтому токены сбрасываются лишь при смене
+    # пароля и деактивации. Остальные сохранения, включая last_login,
+    # лишнего запроса к токенам не делают.
+    if created:
+        return
+    if update_fields is None:
+        # При полном сохранении новый пароль выдает set_password.
+        relevant = instance._password is not None or not instance.is_active
+    else:
+        relevant = 'password' in update_fields or (
+            'is_active' in update_fields and not instance.is_active
+        )
+    if not relevant:
+        return
+    keys = list(Token.objects.filter(user=instance).values_list(
+        'key', flat=True
+    ))
+    if keys:
+        transaction.on_commit(lambda: token_cache.invalidate(keys))
@@ -0,0 +1,847 @@
+import csv
+import io
+import json
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import connection
+from django.test import (
+    RequestFactory,
+    TestCase,
+    override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Subscription
+)
+from recipes.search import refresh_ingredient_ids
+from recipes.tests import create_recipe, create_user
+from recipes.versions import INGREDIENTS_VERSION, bump_version
+
+from .async_views import async_read_view, recipe_detail
+from .authentication import token_cache_key
+from .relations import (
+    FAVORITES,
+    SHOPPING_CART,
+    SUBSCRIPTIONS,
+    add_relation,
+    remove_relation
+)
+from .profiling import metrics_view
+from .shopping_list import ShoppingList
+from .urls import router
+
+User = get_user_model()
+
+
+class CounterTests(TestCase):
+
+    def setUp(self):
+        self.user = create_user(1)
+        self.author = create_user(2)
+        self.ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г'
+        )
+        self.recipe = create_recipe(self.author, [self.ingredient])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_favorite_toggle_updates_counter(self):
+        url = f'/api/recipes/{self.recipe.pk}/favorite/'
+
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 400)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+
+    def test_unfavorite_with_drifted_counter(self):
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+
+        response = self.client.delete(
+            f'/api/recipes/{self.recipe.pk}/favorite/'
+        )
+
+        self.assertEqual(response.status_code, 204)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+
+    def test_subscribe_toggle_updates_counter(self):
+        url = f'/api/users/{self.author.pk}/subscribe/'
+
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.subscribers_count, 1)
+
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.subscribers_count, 0)
+
+    def test_unsubscribe_with_drifted_counter(self):
+        Subscription.objects.create(user=self.user, author=self.author)
+
+        response = self.client.delete(
+            f'/api/users/{self.author.pk}/subscribe/'
+        )
+
+        self.assertEqual(response.status_code, 204)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.subscribers_count, 0)
+
+    def test_recipe_delete_with_drifted_counters(self):
+        self.client.force_authenticate(self.author)
+
+        response = self.client.delete(f'/api/recipes/{self.recipe.pk}/')
+
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Recipe.objects.filter(pk=self.recipe.pk).exists())
+        self.author.refresh_from_db()
+        self.ingredient.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 0)
+        self.assertEqual(self.ingredient.recipes_count, 0)
+
+
+class RelationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user(1)
+        self.author = create_user(2)
+        self.recipe = create_recipe(self.author)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_add_and_remove_are_idempotent(self):
+        for name, target_id in (
+            (FAVORITES, self.recipe.pk),
+            (SHOPPING_CART, self.recipe.pk),
+            (SUBSCRIPTIONS, self.author.pk),
+        ):
+            with self.subTest(name):
+                self.assertTrue(add_relation(name, self.user.pk, target_id))
+                self.assertFalse(add_relation(name, self.user.pk, target_id))
+                self.assertTrue(
+                    remove_relation(name, self.user.pk, target_id)
+                )
+                self.assertFalse(
+                    remove_relation(name, self.user.pk, target_id)
+                )
+
+    def test_missing_target_is_not_added(self):
+        self.assertFalse(add_relation(FAVORITES, self.user.pk, 0))
+        self.assertEqual(
+            self.client.post('/api/recipes/0/shopping_cart/').status_code,
+            404
+        )
+        self.assertEqual(
+            self.client.delete('/api/recipes/0/shopping_cart/').status_code,
+            404
+        )
+        self.assertFalse(ShoppingCart.objects.exists())
+
+    def test_repeated_requests_keep_one_row(self):
+        url = f'/api/recipes/{self.recipe.pk}/shopping_cart/'
+        detail = f'/api/recipes/{self.recipe.pk}/'
+
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.assertEqual(ShoppingCart.objects.count(), 1)
+        self.assertTrue(
+            self.client.get(detail).data['is_in_shopping_cart']
+        )
+
+        # Кэш множеств сбрасывается после коммита.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 400)
+        self.assertFalse(ShoppingCart.objects.exists())
+        self.assertFalse(
+            self.client.get(detail).data['is_in_shopping_cart']
+        )
+
+    def test_add_does_not_read_relation_first(self):
+        with CaptureQueriesContext(connection) as context:
+            add_relation(FAVORITES, self.user.pk, self.recipe.pk)
+
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertTrue(
+            context.captured_queries[0]['sql'].startswith('INSERT')
+        )
+
+
+class RecipeIngredientsUpdateTests(TestCase):
+
+    def setUp(self):
+        self.author = create_user(1)
+        self.salt, self.flour, self.sugar = Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('соль', 'мука', 'сахар')
+        )
+        self.recipe = create_recipe(self.author, [self.salt, self.flour])
+        Ingredient.objects.filter(
+            pk__in=[self.salt.pk, self.flour.pk]
+        ).update(recipes_count=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def update(self, *ingredients):
+        return self.client.patch(
+            f'/api/recipes/{self.recipe.pk}/',
+            {
+                'name': 'Рецепт',
+                'text': 'Описание',
+                'cooking_time': 5,
+                'ingredients': [
+                    {'id': ingredient.pk, 'amount': amount}
+                    for ingredient, amount in ingredients
+                ],
+            },
+            format='json'
+        )
+
+    def test_only_changed_rows_are_written(self):
+        salt_row = RecipeIngredient.objects.get(ingredient=self.salt)
+
+        response = self.update((self.salt, 5), (self.sugar, 3))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            dict(self.recipe.recipe_ingredients.values_list(
+                'ingredient_id', 'amount'
+            )),
+            {self.salt.pk: 5, self.sugar.pk: 3}
+        )
+        self.assertEqual(
+            RecipeIngredient.objects.get(ingredient=self.salt).pk,
+            salt_row.pk
+        )
+        self.recipe.refresh_from_db()
+        self.assertEqual(
+            self.recipe.ingredient_ids, sorted([self.salt.pk, self.sugar.pk])
+        )
+        self.assertEqual(
+            dict(Ingredient.objects.values_list('name', 'recipes_count')),
+            {'соль': 1, 'мука': 0, 'сахар': 1}
+        )
+
+    def test_unchanged_ingredients_are_not_written(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.update((self.salt, 2), (self.flour, 2))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([
+            query for query in context.captured_queries
+            if 'recipes_recipeingredient' in query['sql']
+            and not query['sql'].startswith('SELECT')
+        ])
+
+    def test_ingredients_are_resolved_in_one_query(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.update(
+                (self.salt, 1), (self.flour, 1), (self.sugar, 1)
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len([
+            query for query in context.captured_queries
+            if 'FROM "recipes_ingredient"' in query['sql']
+        ]), 1)
+
+    def test_unknown_ingredients_are_listed(self):
+        response = self.update(
+            (self.salt, 1), (Ingredient(pk=10**6 + 1), 1),
+            (Ingredient(pk=10**6), 1)
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(
+            f'{10**6}, {10**6 + 1}', str(response.data['ingredients'])
+        )
+        self.assertEqual(self.recipe.recipe_ingredients.count(), 2)
+
+
+class AnonymousCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user(1)
+        self.author = create_user(2)
+        self.recipe = create_recipe(self.author)
+        self.client = APIClient()
+        self.anonymous = APIClient()
+
+    def test_favorite_keeps_list_cache(self):
+        self.client.force_authenticate(self.user)
+        response = self.anonymous.get('/api/recipes/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/recipes/{self.recipe.pk}/favorite/')
+
+        response = self.anonymous.get('/api/recipes/')
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_favorite_refreshes_recipe_detail(self):
+        self.client.force_authenticate(self.user)
+        url = f'/api/recipes/{self.recipe.pk}/'
+        self.assertEqual(self.anonymous.get(url).data['favorites_count'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/recipes/{self.recipe.pk}/favorite/')
+
+        response = self.anonymous.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['favorites_count'], 1)
+
+    def test_subscribe_refreshes_recipe_detail(self):
+        self.client.force_authenticate(self.user)
+        url = f'/api/recipes/{self.recipe.pk}/'
+        response = self.anonymous.get(url)
+        self.assertEqual(response.data['author']['subscribers_count'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/users/{self.author.pk}/subscribe/')
+
+        fresh = self.anonymous.get(url)
+        self.assertEqual(fresh['X-Cache'], 'MISS')
+        self.assertNotEqual(fresh['ETag'], response['ETag'])
+        self.assertEqual(fresh.data['author']['subscribers_count'], 1)
+
+
+class IngredientSearchTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('фасоль', 'соль морская', 'масло', 'соль', 'сода')
+        )
+
+    def search(self, name):
+        response = APIClient().get('/api/ingredients/', {'name': name})
+        self.assertEqual(response.status_code, 200)
+        return [ingredient['name'] for ingredient in response.data]
+
+    def test_prefix_matches_come_first(self):
+        expected = ['соль', 'соль морская', 'фасоль']
+        for in_memory in (True, False):
+            with self.subTest(in_memory=in_memory):
+                with override_settings(
+                    INGREDIENT_SEARCH_IN_MEMORY=in_memory
+                ):
+                    self.assertEqual(self.search('сол'), expected)
+                    self.assertEqual(self.search('ыы'), [])
+
+    @override_settings(INGREDIENT_SEARCH_IN_MEMORY=True)
+    def test_in_memory_search_ignores_case(self):
+        self.assertEqual(
+            self.search('СОЛ'), ['соль', 'соль морская', 'фасоль']
+        )
+
+    @override_settings(INGREDIENT_SEARCH_IN_MEMORY=True)
+    def test_in_memory_index_sees_new_ingredients(self):
+        self.search('сол')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='солод', measurement_unit='г')
+
+        self.assertEqual(
+            self.search('сол'), ['солод', 'соль', 'соль морская', 'фасоль']
+        )
+
+
+class ShoppingListTests(TestCase):
+
+    def setUp(self):
+        self.user = create_user(1)
+        author = create_user(2)
+        salt = Ingredient.objects.create(name='соль', measurement_unit='г')
+        flour = Ingredient.objects.create(name='мука', measurement_unit='г')
+        self.first = create_recipe(author, [salt, flour], name='Хлеб')
+        self.second = create_recipe(author, [salt], name='Суп')
+        other = create_recipe(author, [flour], name='Блины')
+        for recipe in (self.first, self.second):
+            ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        ShoppingCart.objects.create(user=author, recipe=other)
+
+    def test_totals_are_summed_per_ingredient(self):
+        self.assertEqual(list(ShoppingList(self.user).ingredients()), [
+            {
+                'name': 'Мука',
+                'amount': 2,
+                'measurement_unit': 'г',
+                'recipes': [('Хлеб', 'user2')],
+            },
+            {
+                'name': 'Соль',
+                'amount': 4,
+                'measurement_unit': 'г',
+                'recipes': [('Хлеб', 'user2'), ('Суп', 'user2')],
+            },
+        ])
+
+    def test_empty_cart(self):
+        shopping_list = ShoppingList(create_user(3))
+
+        self.assertEqual(list(shopping_list.ingredients()), [])
+        self.assertEqual(list(shopping_list.recipes()), [])
+
+    def download(self, **params):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(
+            '/api/recipes/download_shopping_cart/', params
+        )
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_text_renderer(self):
+        response, content = self.download()
+
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn('shopping_list.txt', response['Content-Disposition'])
+        self.assertIn(
+            '2. Соль - 4 г (для рецептов: Хлеб (автор: user2), '
+            'Суп (автор: user2))',
+            content
+        )
+        self.assertTrue(content.endswith(
+            'Рецепты в корзине:\nХлеб (автор: user2)\nСуп (автор: user2)'
+        ))
+
+    def test_csv_renderer(self):
+        response, content = self.download(format='csv')
+
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        self.assertEqual(list(csv.reader(io.StringIO(content))), [
+            ['Продукт', 'Количество', 'Единица измерения', 'Рецепты'],
+            ['Мука', '2', 'г', 'Хлеб (автор: user2)'],
+            ['Соль', '4', 'г', 'Хлеб (автор: user2); Суп (автор: user2)'],
+        ])
+
+    def test_json_renderer(self):
+        response, content = self.download(format='json')
+
+        data = json.loads(content)
+        self.assertEqual(
+            [(item['name'], item['amount']) for item in data['ingredients']],
+            [('Мука', 2), ('Соль', 4)]
+        )
+        self.assertEqual(data['recipes'], [
+            {'name': 'Хлеб', 'author': 'user2'},
+            {'name': 'Суп', 'author': 'user2'},
+        ])
+
+
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        author = create_user(1)
+        self.recipes = [
+            create_recipe(author, name=f'Рецепт {index}')
+            for index in range(7)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(author)
+
+    def pages(self, url):
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            yield [recipe['id'] for recipe in response.data['results']]
+            url = response.data['next']
+
+    def test_cursor_walks_every_recipe_once(self):
+        pages = self.pages('/api/recipes/?cursor=&limit=3')
+
+        first = next(pages)
+        # Новый рецепт не сдвигает следующие страницы.
+        create_recipe(self.recipes[0].author, name='Новый рецепт')
+
+        ids = [recipe.pk for recipe in reversed(self.recipes)]
+        self.assertEqual([first, *pages], [ids[:3], ids[3:6], ids[6:]])
+
+    def test_cursor_ignores_ordering_and_count(self):
+        response = self.client.get(
+            '/api/recipes/?cursor=&limit=3&ordering=popularity'
+        )
+
+        self.assertNotIn('count', response.data)
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [recipe.pk for recipe in self.recipes[:-4:-1]]
+        )
+
+    def test_page_number_pagination_is_default(self):
+        response = self.client.get('/api/recipes/?page=3&limit=3')
+
+        self.assertEqual(response.data['count'], 7)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+
+
+class IngredientFilterTests(TestCase):
+
+    def setUp(self):
+        author = create_user(1)
+        self.salt, self.flour, self.milk = Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('соль', 'мука', 'молоко')
+        )
+        self.bread = create_recipe(author, [self.salt, self.flour], 'Хлеб')
+        self.soup = create_recipe(author, [self.salt], 'Суп')
+        self.pancakes = create_recipe(
+            author, [self.flour, self.milk], 'Блины'
+        )
+        refresh_ingredient_ids(
+            [self.bread.pk, self.soup.pk, self.pancakes.pk]
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(author)
+
+    def names(self, query):
+        response = self.client.get(f'/api/recipes/?limit=10&{query}')
+        self.assertEqual(response.status_code, 200)
+        return {recipe['name'] for recipe in response.data['results']}
+
+    def test_all_ingredients_by_default(self):
+        ids = f'{self.salt.pk},{self.flour.pk}'
+
+        self.assertEqual(self.names(f'ingredients={ids}'), {'Хлеб'})
+        self.assertEqual(
+            self.names(f'ingredients={ids}&match=all'), {'Хлеб'}
+        )
+
+    def test_any_ingredient(self):
+        self.assertEqual(
+            self.names(
+                f'ingredients={self.salt.pk},{self.milk.pk}&match=any'
+            ),
+            {'Хлеб', 'Суп', 'Блины'}
+        )
+
+    def test_exclude_ingredients(self):
+        self.assertEqual(
+            self.names(f'exclude_ingredients={self.milk.pk}'),
+            {'Хлеб', 'Суп'}
+        )
+        self.assertEqual(
+            self.names(
+                f'ingredients={self.flour.pk}&match=any'
+                f'&exclude_ingredients={self.salt.pk}'
+            ),
+            {'Блины'}
+        )
+
+    def test_unknown_match_is_rejected(self):
+        response = self.client.get(
+            f'/api/recipes/?ingredients={self.salt.pk}&match=some'
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+
+class RecipeSearchTests(TestCase):
+
+    def setUp(self):
+        author = create_user(1)
+        self.soup = create_recipe(author, name='Суп с грибами')
+        self.pie = create_recipe(author, name='Пирог')
+        self.salad = create_recipe(author, name='Салат')
+        Recipe.objects.filter(pk=self.pie.pk).update(
+            text='Начинка из жареных грибов'
+        )
+        self.client = APIClient()
+
+    def names(self, query):
+        response = self.client.get('/api/recipes/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['name'] for recipe in response.data['results']]
+
+    def test_name_matches_come_first(self):
+        self.assertEqual(self.names('гриб'), ['Суп с грибами', 'Пирог'])
+
+    def test_search_combines_with_filters(self):
+        response = self.client.get(
+            '/api/recipes/',
+            {'search': 'гриб', 'author': self.soup.author_id, 'limit': 1}
+        )
+
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(
+            [recipe['name'] for recipe in response.data['results']],
+            ['Суп с грибами']
+        )
+
+    def test_nothing_found(self):
+        self.assertEqual(self.names('борщ'), [])
+
+
+class QueryCountTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(0)
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {index}', measurement_unit='г')
+            for index in range(3)
+        )
+        for author_index in range(1, 5):
+            author = create_user(author_index)
+            Subscription.objects.create(user=cls.user, author=author)
+            for index in range(6):
+                recipe = create_recipe(
+                    author, ingredients, name=f'Рецепт {index}'
+                )
+                Favorite.objects.create(user=cls.user, recipe=recipe)
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_recipe_list_does_not_depend_on_page_size(self):
+        counts = {
+            self.count_queries(f'/api/recipes/?limit={limit}')
+            for limit in (2, 6, 20)
+        }
+        self.assertEqual(len(counts), 1)
+
+    def test_subscriptions_do_not_depend_on_limits(self):
+        counts = {
+            self.count_queries(
+                f'/api/users/subscriptions/?limit={limit}'
+                f'&recipes_limit={recipes_limit}'
+            )
+            for limit in (1, 2, 4)
+            for recipes_limit in (2, 6, 20)
+        }
+        self.assertEqual(len(counts), 1)
+
+
+@override_settings(METRICS_TOKEN='secret')
+class MetricsAccessTests(TestCase):
+
+    def get(self, user, **headers):
+        request = RequestFactory().get('/api/_metrics', headers=headers)
+        request.user = user
+        return metrics_view(request)
+
+    def test_anonymous_is_forbidden(self):
+        self.assertEqual(self.get(AnonymousUser()).status_code, 403)
+        response = self.get(AnonymousUser(), authorization='Bearer wrong')
+        self.assertEqual(response.status_code, 403)
+
+    def test_regular_user_is_forbidden(self):
+        self.assertEqual(self.get(create_user(1)).status_code, 403)
+
+    def test_staff_and_token_are_allowed(self):
+        staff = create_user(1)
+        staff.is_staff = True
+        self.assertEqual(self.get(staff).status_code, 200)
+        response = self.get(AnonymousUser(), authorization='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user(1)
+        self.recipe = create_recipe(create_user(2))
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+        self.client = APIClient()
+
+    def test_ingredients_not_modified_until_catalogue_changes(self):
+        Ingredient.objects.create(name='соль', measurement_unit='г')
+        etag = self.client.get('/api/ingredients/')['ETag']
+
+        response = self.client.get(
+            '/api/ingredients/', headers={'if-none-match': etag}
+        )
+        self.assertEqual(response.status_code, 304)
+
+        bump_version(INGREDIENTS_VERSION)
+        response = self.client.get(
+            '/api/ingredients/', headers={'if-none-match': etag}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_recipe_not_modified_until_it_changes(self):
+        response = self.client.get(self.url)
+        etag, modified = response['ETag'], response['Last-Modified']
+
+        self.assertEqual(
+            self.client.get(
+                self.url, headers={'if-none-match': etag}
+            ).status_code,
+            304
+        )
+        self.assertEqual(
+            self.client.get(
+                self.url, headers={'if-modified-since': modified}
+            ).status_code,
+            304
+        )
+
+        Recipe.objects.filter(pk=self.recipe.pk).update(favorites_count=1)
+        self.assertEqual(
+            self.client.get(
+                self.url, headers={'if-none-match': etag}
+            ).status_code,
+            200
+        )
+
+    def test_recipe_etag_depends_on_user_relations(self):
+        self.client.force_authenticate(self.user)
+        etag = self.client.get(self.url)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'{self.url}shopping_cart/')
+        response = self.client.get(self.url, headers={'if-none-match': etag})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['is_in_shopping_cart'])
+        self.assertNotIn('Last-Modified', response)
+
+
+class AsyncRecipeDetailTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.recipe = create_recipe(create_user(1))
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+        self.sync_view = {
+            url.name: url.callback for url in router.urls
+        }['recipes-detail']
+        self.async_view = async_read_view(recipe_detail, self.sync_view)
+
+    def get(self, **headers):
+        request = RequestFactory().get(self.url, headers=headers)
+        return async_to_sync(self.async_view)(request, pk=self.recipe.pk)
+
+    def test_validators_match_sync_view(self):
+        sync_response = self.sync_view(
+            RequestFactory().get(self.url), pk=self.recipe.pk
+        )
+        response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], sync_response['ETag'])
+        self.assertEqual(
+            response['Last-Modified'], sync_response['Last-Modified']
+        )
+
+    def test_not_modified_before_serialization(self):
+        etag = self.get()['ETag']
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.get(if_none_match=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(context.captured_queries), 1)
+
+
+class TokenCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user(1)
+        self.client = APIClient()
+        self.token = self.client.post('/api/auth/token/login/', {
+            'email': self.user.email,
+            'password': 'pass12345!'
+        }).data['auth_token']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def token_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        return response, [
+            query for query in context.captured_queries
+            if 'authtoken_token' in query['sql']
+        ]
+
+    def test_shared_cache_stores_only_user_id(self):
+        self.client.get('/api/recipes/')
+
+        self.assertEqual(
+            cache.get(token_cache_key(self.token)), self.user.pk
+        )
+        response, queries = self.token_queries('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+    def test_me_with_cached_user(self):
+        self.client.get('/api/recipes/')
+
+        response, queries = self.token_queries('/api/users/me/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+        self.assertEqual(response.data['email'], self.user.email)
+        self.assertEqual(response.data['username'], self.user.username)
+
+    def test_logout_revokes_cached_token(self):
+        self.client.get('/api/recipes/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/auth/token/logout/')
+
+        self.assertEqual(self.client.get('/api/recipes/').status_code, 401)
+
+    def cached_after_save(self, save):
+        self.client.get('/api/recipes/')
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as context:
+                save(User.objects.get(pk=self.user.pk))
+        token_queries = [
+            query for query in context.captured_queries
+            if 'authtoken_token' in query['sql']
+        ]
+        cached = cache.get(token_cache_key(self.token)) is not None
+        return cached, len(token_queries)
+
+    def test_profile_saves_keep_cached_token(self):
+        def update_last_login(user):
+            user.save(update_fields=['last_login'])
+
+        def rename(user):
+            user.first_name = 'Другое'
+            user.save()
+
+        self.assertEqual(self.cached_after_save(update_last_login), (True, 0))
+        self.assertEqual(self.cached_after_save(rename), (True, 0))
+
+    def test_password_change_and_deactivation_revoke_cached_token(self):
+        def change_password(user):
+            user.set_password('new-pass12345!')
+            user.save()
+
+        def deactivate(user):
+            user.is_active = False
+            user.save(update_fields=['is_active'])
+
+        self.assertEqual(self.cached_after_save(change_password), (False, 1))
+        self.assertEqual(self.cached_after_save(deactivate), (False, 1))
@@ -3,7 +3,10 @@ from .views import (
     IngredientViewSet,
     RecipeViewSet,
 )
+from .async_views import async_urlpatterns
+from .profiling import metrics_view
 from rest_framework import routers
+from django.conf import settings
 from django.urls import path, include
 
 router = routers.DefaultRouter()
@@ -15,3 +18,9 @@ urlpatterns = [
     path('auth/', include('djoser.urls.authtoken')),
     path("", include(router.urls)),
 ]
+
+if settings.ASYNC_READ_VIEWS:
+    urlpatterns[:0] = async_urlpatterns(router)
+
+if settings.METRICS_ENDPOINT:
+    urlpatterns.insert(0, path('_metrics', metrics_view, name='metrics'))
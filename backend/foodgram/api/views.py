@@ -1,17 +1,34 @@
-from django.http import FileResponse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    Case,
+    F,
+    Prefetch,
+    Value,
+    When,
+    Window
+)
+from django.db.models.functions import RowNumber
+from django.http import StreamingHttpResponse
 from django.urls import reverse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_headers
 from http import HTTPStatus
 from django.contrib.auth import get_user_model
 from django_filters.rest_framework import (
     DjangoFilterBackend,
     FilterSet,
+    BaseInFilter,
     BooleanFilter,
+    CharFilter,
+    ChoiceFilter,
     NumberFilter
 )
 from djoser.views import UserViewSet
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.filters import OrderingFilter
 from rest_framework.response import Response
 from rest_framework.permissions import (
     IsAuthenticatedOrReadOnly,
@@ -27,15 +44,42 @@ from .serializers import (
     UserSubscriptionRecipeSerializer,
     AvatarUploadSerializer,
 )
+from recipes.counters import change_counter
+from recipes.ingredient_index import ingredient_index
 from recipes.models import (
     Recipe,
+    RecipeIngredient,
     Ingredient,
-    Subscription,
     Favorite,
     ShoppingCart
 )
+from recipes.search import (
+    MATCH_ALL,
+    MATCH_ANY,
+    exclude_ingredients,
+    filter_by_ingredients,
+    search_recipes
+)
+from recipes.versions import author_recipes_version, bump_version
+from .cache import AnonymousResponseCacheMixin
+from .conditional import (
+    ingredients_etag,
+    ingredients_last_modified,
+    recipe_etag,
+    recipe_last_modified
+)
+from .pagination import StandardResultsSetPagination
+from .profiling import QueryProfilingMixin
+from .relations import (
+    FAVORITES,
+    SHOPPING_CART,
+    SUBSCRIPTIONS,
+    add_relation,
+    get_relations,
+    remove_relation
+)
 from .permission import IsAuthorOrReadOnly
-from datetime import datetime
+from .shopping_list import SHOPPING_LIST_RENDERERS, ShoppingList
 
 
 
@@ -43,39 +87,91 @@ User = get_user_model()
 # Create your views here.
 
 
-class StandardResultsSetPagination(PageNumberPagination):
-    page_size = 6
-    page_size_query_param = 'limit'
-    page_query_param = "page"
-    max_page_size = 50
+class IngredientFilter(FilterSet):
+    name = CharFilter(method='filter_by_name')
 
+    class Meta:
+        model = Ingredient
+        fields = ['name']
+
+    def filter_by_name(self, queryset, name, value):
+        return queryset.filter(name__icontains=value).annotate(
+            is_prefix_match=Case(
+                When(name__istartswith=value, then=Value(True)),
+                default=Value(False),
+            )
+        ).order_by('-is_prefix_match', 'name')
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+
+class IngredientViewSet(QueryProfilingMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     pagination_class = None
     serializer_class = IngredientSerializer
     permission_classes = [AllowAny]
     filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['name']
-
-
-class CustomUserViewSet(UserViewSet):
+    filterset_class = IngredientFilter
+
+    @method_decorator(condition(
+        etag_func=ingredients_etag,
+        last_modified_func=ingredients_last_modified
+    ))
+    def list(self, request, *args, **kwargs):
+        if not settings.INGREDIENT_SEARCH_IN_MEMORY:
+            return super().list(request, *args, **kwargs)
+        name = request.query_params.get('name')
+        if name:
+            return Response(ingredient_index.search(name))
+        return Response(ingredient_index.all())
+
+
+class CustomUserViewSet(QueryProfilingMixin, UserViewSet):
     queryset = User.objects.all()
     pagination_class = StandardResultsSetPagination
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
+    @staticmethod
+    def _with_subscription_data(queryset, request):
+        recipes = Recipe.objects.order_by('-id')
+        limit = request.query_params.get('recipes_limit')
+        if limit and limit.isdigit():
+            recipes = recipes.annotate(
+                row_number=Window(
+                    RowNumber(),
+                    partition_by=F('author'),
+                    order_by=F('id').desc()
+                )
+            ).filter(row_number__lte=int(limit))
+
+        return queryset.prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='limited_recipes')
+        )
+
+    @staticmethod
+    def _change_subscribers_count(author_id, delta):
+        change_counter(
+            User.objects.filter(pk=author_id), 'subscribers_count', delta
+        )
+        transaction.on_commit(
+            lambda: bump_version(author_recipes_version(author_id))
+        )
+
     @action(methods=['get'], detail=False,
             permission_classes=[IsAuthenticated])
     def me(self, request):
+        # Из кэша токенов приходит пользователь с одним id, а счетчики
+        # меняются запросами UPDATE в обход сигналов.
+        request.user = User.objects.get(pk=request.user.pk)
         return super().me(request)
 
     @action(methods=['put', 'delete'], detail=True,
             permission_classes=[IsAuthenticated])
     def avatar(self, request, id):
         if request.method == 'DELETE' and request.user.avatar:
-            request.user.avatar.delete()
-            request.user.save()
+            # Файл может быть общим с другими объектами, его удалит
+            # collect_media, когда на него не останется ссылок.
+            request.user.avatar = None
+            request.user.save(update_fields=['avatar'])
             return Response(status=status.HTTP_204_NO_CONTENT)
         if not request.data:
             return Response(
@@ -97,40 +193,40 @@ class CustomUserViewSet(UserViewSet):
 
     @action(methods=['post', 'delete'], detail=True,
             permission_classes=[IsAuthenticated])
+    @transaction.atomic
     def subscribe(self, request, id):
-        user = get_object_or_404(User, id=id)
+        user_id = request.user.id
+        author_id = int(id)
 
         if request.method == 'POST':
-            user_id = request.user.id
-            author_id = user.id
-
             if user_id == author_id:
                 return Response({'error': 'Нельзя подписаться на себя'},
                                 status=status.HTTP_400_BAD_REQUEST)
 
-            subscription, created = Subscription.objects.get_or_create(
-                user_id=user_id,
-                author_id=author_id
-            )
-
-            if not created:
+            if not add_relation(SUBSCRIPTIONS, user_id, author_id):
+                author = get_object_or_404(User, id=author_id)
                 return Response(
-                    {'error': f'Вы уже подписаны на пользователя {subscription.user}'},
+                    {'error': f'Вы уже подписаны на пользователя {author}'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
+            self._change_subscribers_count(author_id, 1)
+            get_relations(request).invalidate(SUBSCRIPTIONS)
 
             userSubRecipeSerializer = UserSubscriptionRecipeSerializer(
-                user,
+                self._with_subscription_data(
+                    User.objects.filter(id=author_id), request
+                ).get(),
                 context={
                     'request': request,
                 }
             )
             return Response(userSubRecipeSerializer.data,
                             status=status.HTTP_201_CREATED)
-        subscribe = request.user.author.filter(author=user)
-        if subscribe.exists():
-            subscribe.delete()
+        if remove_relation(SUBSCRIPTIONS, user_id, author_id):
+            self._change_subscribers_count(author_id, -1)
+            get_relations(request).invalidate(SUBSCRIPTIONS)
             return Response(status=status.HTTP_204_NO_CONTENT)
+        user = get_object_or_404(User, id=author_id)
         return Response(
             {'error': f'Нельзя удалить отсутствующую подписку на {user.username}'},
             status=status.HTTP_400_BAD_REQUEST
@@ -139,10 +235,9 @@ class CustomUserViewSet(UserViewSet):
     @action(methods=['get'], detail=False,
             permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
-        author_users_ids = Subscription.objects.filter(
-            user=request.user
-        ).values_list('author_id', flat=True)
-        queryset = User.objects.filter(id__in=author_users_ids)
+        queryset = self._with_subscription_data(
+            User.objects.filter(authors__user=request.user), request
+        )
 
         pages = self.paginate_queryset(queryset)
         serializer = UserSubscriptionRecipeSerializer(
@@ -156,14 +251,35 @@ class CustomUserViewSet(UserViewSet):
         return self.get_paginated_response(serializer.data)
 
 
+class NumberInFilter(BaseInFilter, NumberFilter):
+    pass
+
+
 class RecipeFilter(FilterSet):
     is_favorited = BooleanFilter(method="filter_is_favorited")
     is_in_shopping_cart = BooleanFilter(method="filter_is_in_shopping_cart")
     author = NumberFilter(method="filter_by_author")
+    search = CharFilter(method="filter_search")
+    ingredients = NumberInFilter(method="filter_ingredients")
+    exclude_ingredients = NumberInFilter(
+        method="filter_excluded_ingredients"
+    )
+    match = ChoiceFilter(
+        choices=((MATCH_ALL, MATCH_ALL), (MATCH_ANY, MATCH_ANY)),
+        method="filter_match"
+    )
 
     class Meta:
         model = Recipe
-        fields = ['is_favorited', 'is_in_shopping_cart', 'author']
+        fields = [
+            'is_favorited',
+            'is_in_shopping_cart',
+            'author',
+            'search',
+            'ingredients',
+            'exclude_ingredients',
+            'match'
+        ]
 
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
@@ -178,43 +294,121 @@ class RecipeFilter(FilterSet):
         return queryset
 
     def filter_by_author(self, queryset, name, value):
-        user = self.request.user
-        if user.is_authenticated:
-            author = get_object_or_404(User, id=value)
-            if author:
-                return queryset.filter(author_id=author)
+        author = get_object_or_404(User, id=value)
+        return queryset.filter(author_id=author)
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def filter_ingredients(self, queryset, name, value):
+        return filter_by_ingredients(
+            queryset,
+            [int(pk) for pk in value],
+            self.form.cleaned_data.get('match') or MATCH_ALL
+        )
+
+    def filter_excluded_ingredients(self, queryset, name, value):
+        return exclude_ingredients(queryset, [int(pk) for pk in value])
+
+    def filter_match(self, queryset, name, value):
+        # Режим сопоставления учитывается в filter_ingredients.
         return queryset
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeOrderingFilter(OrderingFilter):
+
+    def filter_queryset(self, request, queryset, view):
+        ordering = self.get_ordering(request, queryset, view)
+        if not ordering:
+            return queryset
+        if not {'id', '-id'} & set(ordering):
+            ordering = [*ordering, '-id']
+        return queryset.order_by(*map(self.get_ordering_expression, ordering))
+
+    @staticmethod
+    def get_ordering_expression(field):
+        if field.lstrip('-') != 'popularity':
+            return field
+        score = F('popularity__score')
+        if field.startswith('-'):
+            return score.desc(nulls_last=True)
+        return score.asc(nulls_first=True)
+
+
+class RecipeViewSet(QueryProfilingMixin, AnonymousResponseCacheMixin,
+                    viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     pagination_class = StandardResultsSetPagination
     serializer_class = RecipeSerializer
     permission_classes = [IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
-    filter_backends = [DjangoFilterBackend]
+    filter_backends = [DjangoFilterBackend, RecipeOrderingFilter]
     filterset_class = RecipeFilter
+    ordering_fields = ['popularity', 'cooking_time', 'name', 'id']
+
+    def get_queryset(self):
+        return Recipe.objects.select_related('author').prefetch_related(
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            )
+        )
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context["request"] = self.request
         return context
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        change_counter(
+            User.objects.filter(pk=instance.author_id), 'recipes_count', -1
+        )
+        change_counter(
+            Ingredient.objects.filter(recipe_ingredients__recipe=instance),
+            'recipes_count',
+            -1
+        )
+        instance.delete()
+
+    @method_decorator(vary_on_headers('Authorization'))
+    @method_decorator(condition(
+        etag_func=recipe_etag,
+        last_modified_func=recipe_last_modified
+    ))
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     @staticmethod
-    def _toggle_item(request, pk, model):
-        recipe = get_object_or_404(Recipe, id=pk)
-        relation = getattr(
-            request.user,
-            model._meta.default_related_name
+    def _change_recipe_counter(recipe_id, counter_field, delta):
+        if counter_field is None:
+            return
+        # Версии кэша не трогаем: ключ ответа рецепту анонимам строится
+        # из его счетчиков, а сброс общей версии на каждый клик обнулял
+        # бы весь кэш.
+        change_counter(
+            Recipe.objects.filter(pk=recipe_id), counter_field, delta
         )
 
+    @staticmethod
+    @transaction.atomic
+    def _toggle_item(request, pk, model, relation_name,
+                     counter_field=None):
+        # Связь добавляется и удаляется одним запросом, рецепт читается
+        # только для ответа или текста ошибки.
         if request.method == 'POST':
-            _, created = relation.get_or_create(recipe=recipe)
-        
+            created = add_relation(relation_name, request.user.id, pk)
+            recipe = get_object_or_404(Recipe, id=pk)
+
             if not created:
                 return Response(
-                    {'error': f'Уже добавлен {recipe.name} в {model._meta.default_related_name}'},
+                    {'error': f'Уже добавлен {recipe.name} '
+                              f'в {model._meta.verbose_name}'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
+            RecipeViewSet._change_recipe_counter(
+                recipe.pk, counter_field, 1
+            )
+            get_relations(request).invalidate(relation_name)
             serializer = RecipeShortSerializer(
                 recipe,
                 context={
@@ -223,11 +417,14 @@ class RecipeViewSet(viewsets.ModelViewSet):
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        if relation.exists():
-            relation.delete()
+        if remove_relation(relation_name, request.user.id, pk):
+            RecipeViewSet._change_recipe_counter(pk, counter_field, -1)
+            get_relations(request).invalidate(relation_name)
             return Response(status=status.HTTP_204_NO_CONTENT)
+        recipe = get_object_or_404(Recipe, id=pk)
         return Response(
-            {'error': f'Нельзя удалить {recipe.name} из {model._meta.default_related_name}'},
+            {'error': f'Нельзя удалить {recipe.name} '
+                      f'из {model._meta.verbose_name}'},
             status=status.HTTP_400_BAD_REQUEST
         )
 
@@ -237,7 +434,9 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return self._toggle_item(
             request,
             pk,
-            Favorite
+            Favorite,
+            FAVORITES,
+            'favorites_count'
         )
 
     @action(methods=['post', 'delete'], detail=True,
@@ -246,62 +445,34 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return self._toggle_item(
             request,
             pk,
-            ShoppingCart
+            ShoppingCart,
+            SHOPPING_CART
         )
 
     @action(methods=["get"], detail=False,
-            permission_classes=[IsAuthenticated])
+            permission_classes=[IsAuthenticated],
+            renderer_classes=SHOPPING_LIST_RENDERERS)
     def download_shopping_cart(self, request):
-        recipes_in_cart = Recipe.objects.filter(
-            shopping_carts__user=request.user
-        ).prefetch_related('recipe_ingredients__ingredient')
-
-        ingredients_summary = {}
-        recipes_list = []
-
-        for recipe in recipes_in_cart:
-            recipes_list.append(f"{recipe.name} "
-                                f"(автор: {recipe.author.username})")
-            for recipe_ingredient in recipe.recipe_ingredients.all():
-                ingredient = recipe_ingredient.ingredient
-                amount = recipe_ingredient.amount
-                name = ingredient.name.capitalize()
-                unit = ingredient.measurement_unit
-                if name not in ingredients_summary:
-                    ingredients_summary[name] = {
-                        'amount': 0,
-                        'unit': unit,
-                        'recipes': set()
-                    }
-                ingredients_summary[name]['amount'] += amount
-                ingredients_summary[name]['recipes'].add(f"{recipe.name} (автор: {recipe.author.username})")
-
-        date_str = datetime.now().strftime("%d.%m.%Y")
-        shopping_list = [
-            f"Список покупок (составлено: {date_str}):"
-        ] + [
-            f"{idx}. {name} - {data['amount']} {data['unit']}"
-            f" (для рецептов: {', '.join(data['recipes'])})"
-            for idx, (name, data) in enumerate(ingredients_summary.items(),
-                                               start=1)
-        ]
-
-        report = '\n'.join([
-            'Отчет по списку покупок',
-            'Продукты:',
-            *shopping_list,
-            'Рецепты в корзине:',
-            *recipes_list
-        ])
-
-        response = FileResponse(
-            report,
-            as_attachment=True,
-            filename='shopping_list.txt'
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(ShoppingList(request.user)),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}'
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{renderer.format}"'
         )
-
         return response
 
+    @action(methods=['get'], detail=False)
+    def top(self, request):
+        queryset = self.get_queryset().filter(
+            popularity__score__gt=0
+        ).order_by('-popularity__score', '-id')
+
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     @action(methods=['get'], detail=True, url_path='get-link')
     def get_link(self, request, pk):
         return Response(
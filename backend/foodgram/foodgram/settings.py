@@ -41,6 +41,7 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
@@ -60,6 +61,26 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+QUERY_PROFILING = os.getenv("QUERY_PROFILING", "False") == "True"
+QUERY_PROFILING_SLOW_MS = int(os.getenv("QUERY_PROFILING_SLOW_MS", 500))
+QUERY_PROFILING_DUPLICATE_THRESHOLD = int(
+    os.getenv("QUERY_PROFILING_DUPLICATE_THRESHOLD", 3)
+)
+
+# /api/_metrics регистрируется только явно. Токен нужен для опроса
+# без учетной записи персонала.
+METRICS_ENDPOINT = os.getenv("METRICS_ENDPOINT", "False") == "True"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+if QUERY_PROFILING:
+    MIDDLEWARE.insert(0, 'api.profiling.QueryProfilingMiddleware')
+
+# wsgi или asgi; под ASGI читающие эндпоинты работают через async ORM.
+SERVER_MODE = os.getenv("SERVER_MODE", "wsgi")
+ASYNC_READ_VIEWS = os.getenv(
+    "ASYNC_READ_VIEWS", str(SERVER_MODE == "asgi")
+) == "True"
+
 ROOT_URLCONF = 'foodgram.urls'
 
 TEMPLATES = [
@@ -92,9 +113,76 @@ DATABASES = {
         "PASSWORD": os.getenv("DATABASE_PASSWORD"),
         "HOST": os.getenv("DATABASE_HOST", "db"),
         "PORT": os.getenv("DATABASE_PORT", "5432"),
+        # Под ASGI постоянные соединения не переиспользуются между
+        # запросами, там нужен пул (DATABASE_POOL).
+        "CONN_MAX_AGE": int(os.getenv(
+            "DATABASE_CONN_MAX_AGE", 0 if SERVER_MODE == "asgi" else 60
+        )),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# Пул psycopg 3 вместо постоянных соединений: соединение берется из пула
+# на время запроса, а с CONN_HEALTH_CHECKS пул проверяет его перед выдачей.
+DATABASE_POOL = os.getenv("DATABASE_POOL", "False") == "True"
+
+if DATABASE_POOL:
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": int(os.getenv("DATABASE_POOL_MIN_SIZE", 2)),
+            "max_size": int(os.getenv("DATABASE_POOL_MAX_SIZE", 10)),
+            "timeout": float(os.getenv("DATABASE_POOL_TIMEOUT", 10)),
+            "max_idle": float(os.getenv("DATABASE_POOL_MAX_IDLE", 600)),
+        },
+    }
+
+if os.getenv("DATABASE_ENGINE") == "sqlite":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.getenv("DATABASE_NAME", BASE_DIR / "db.sqlite3"),
+        }
+    }
+
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+PAGINATION_ESTIMATED_COUNT_THRESHOLD = int(
+    os.getenv("PAGINATION_ESTIMATED_COUNT_THRESHOLD", 100000)
+)
+
+POPULARITY_HALF_LIFE_DAYS = float(os.getenv("POPULARITY_HALF_LIFE_DAYS", 7))
+# created_at ставится до коммита, поэтому инкрементальный пересчет
+# перечитывает события за это окно. Оно должно быть длиннее самой долгой
+# транзакции, добавляющей рецепт в избранное или корзину.
+POPULARITY_REFRESH_OVERLAP = int(os.getenv("POPULARITY_REFRESH_OVERLAP", 600))
+
+IMAGE_PIPELINE_WORKERS = int(os.getenv("IMAGE_PIPELINE_WORKERS", 2))
+
+IMAGE_VARIANT_WIDTHS = (320, 640, 1280)
+
+RELATIONS_CACHE_TIMEOUT = int(os.getenv("RELATIONS_CACHE_TIMEOUT", 300))
+
+RESPONSE_CACHE_TIMEOUT = int(os.getenv("RESPONSE_CACHE_TIMEOUT", 300))
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+TOKEN_CACHE_TIMEOUT = int(os.getenv("TOKEN_CACHE_TIMEOUT", 300))
+# Столько секунд отозванный токен еще принимается читающими запросами
+# в других процессах.
+TOKEN_CACHE_LOCAL_TIMEOUT = int(os.getenv("TOKEN_CACHE_LOCAL_TIMEOUT", 10))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -137,19 +225,32 @@ STATIC_ROOT = '/app/static'
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+STORAGES = {
+    "default": {
+        "BACKEND": "recipes.storage.ContentAddressedStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+}
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "api.authentication.CachedTokenAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
 }
 
+INGREDIENT_SEARCH_IN_MEMORY = (
+    os.getenv("INGREDIENT_SEARCH_IN_MEMORY", "True") == "True"
+)
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'HIDE_USERS': False,
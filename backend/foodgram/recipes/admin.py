@@ -3,6 +3,8 @@ from .models import Recipe, RecipeIngredient, Ingredient
 from django.utils.safestring import mark_safe
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from .models import User, Subscription, Favorite, ShoppingCart
+from .models import MediaBlob, RecipePopularity
+from .search import refresh_ingredient_ids
 
 
 class IngredientRecipeAdmin(admin.ModelAdmin):
@@ -10,6 +12,25 @@ class IngredientRecipeAdmin(admin.ModelAdmin):
     list_filter = ('recipe', 'ingredient')
     search_fields = ('name',)
 
+    @staticmethod
+    def touch_recipes(recipe_ids):
+        refresh_ingredient_ids(recipe_ids)
+        for recipe in Recipe.objects.filter(id__in=recipe_ids):
+            recipe.save(update_fields=['updated_at'])
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        self.touch_recipes([obj.recipe_id])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.touch_recipes([obj.recipe_id])
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = list(queryset.values_list('recipe_id', flat=True))
+        super().delete_queryset(request, queryset)
+        self.touch_recipes(recipe_ids)
+
 
 class RecipeIngredientInline(admin.TabularInline):
     model = RecipeIngredient
@@ -27,7 +48,7 @@ class RecipeAdmin(admin.ModelAdmin):
         'name',
         'cooking_time',
         'author',
-        'get_favorites_count',
+        'favorites_count',
         'get_ingredients_list',
         'get_image_preview',
     )
@@ -36,9 +57,9 @@ class RecipeAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
     inlines = [RecipeIngredientInline]
 
-    @admin.display(description='В избранном')
-    def get_favorites_count(self, obj):
-        return obj.in_favorites.count()
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        refresh_ingredient_ids([form.instance.pk])
 
     @admin.display(description='Ингредиенты')
     @mark_safe
@@ -58,14 +79,10 @@ class RecipeAdmin(admin.ModelAdmin):
 
 
 class IngredientAdmin(admin.ModelAdmin):
-    list_display = ('name', 'measurement_unit', 'get_recipes_count')
+    list_display = ('name', 'measurement_unit', 'recipes_count')
     list_filter = ('measurement_unit',)
     search_fields = ('name', 'measurement_unit',)
 
-    @admin.display(description='Рецептов')
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
 
 class SubscriptionInline(admin.TabularInline):
     model = Subscription
@@ -98,9 +115,9 @@ class UserAdmin(BaseUserAdmin):
                     'get_fio',
                     'email',
                     'get_avatar',
-                    'get_recipes_count',
+                    'recipes_count',
                     'get_subscriptions_count',
-                    'get_subscribers_count')
+                    'subscribers_count')
     list_filter = ('email',
                    'username')
     inlines = [SubscriptionInline, FavoriteInline, ShoppingCartInline]
@@ -129,18 +146,10 @@ class UserAdmin(BaseUserAdmin):
     def get_fio(self, obj):
         return f"{obj.first_name} {obj.last_name}"
 
-    @admin.display(description='Рецепты')
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
     @admin.display(description='Подписки')
     def get_subscriptions_count(self, obj):
         return obj.subscribed_users.count()
 
-    @admin.display(description='Подписчики')
-    def get_subscribers_count(self, obj):
-        return obj.author.count()
-
     @admin.display(description='Аватар')
     @mark_safe
     def get_avatar(self, obj):
@@ -168,8 +177,21 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'recipe__username')
 
 
+class RecipePopularityAdmin(admin.ModelAdmin):
+    list_display = ('recipe', 'score', 'updated_at')
+    readonly_fields = ('recipe', 'score', 'recent_score', 'updated_at')
+
+
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'references', 'updated_at')
+    readonly_fields = ('name', 'references', 'updated_at')
+    search_fields = ('name',)
+
+
 admin.site.register(Subscription, SubscriptionAdmin)
 admin.site.register(Favorite, FavoriteAdmin)
 admin.site.register(ShoppingCart, ShoppingCartAdmin)
 admin.site.register(RecipeIngredient, IngredientRecipeAdmin)
 admin.site.register(Ingredient, IngredientAdmin)
+admin.site.register(RecipePopularity, RecipePopularityAdmin)
+admin.site.register(MediaBlob, MediaBlobAdmin)
@@ -0,0 +1,55 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    Subscription
+)
+
+User = get_user_model()
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'subscribers_count', Subscription, 'author'),
+    (Ingredient, 'recipes_count', RecipeIngredient, 'ingredient'),
+)
+
+
+def change_counter(queryset, field, delta):
+    # Связи можно создать и в обход API (админка, ORM), тогда счетчик
+    # отстает до reconcile_counters. Уходить ниже нуля ему нельзя:
+    # поле положительное, и UPDATE упал бы на ограничении.
+    return queryset.update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def actual_count(related_model, related_field):
+    return Coalesce(Subquery(
+        related_model.objects.filter(
+            **{related_field: OuterRef('pk')}
+        ).order_by().values(related_field).annotate(
+            total=Count('pk')
+        ).values('total')
+    ), 0)
+
+
+def reconcile(model, field, related_model, related_field, batch_size):
+    fixed = 0
+    last_pk = 0
+    while True:
+        batch = list(model.objects.filter(
+            pk__gt=last_pk
+        ).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return fixed
+        last_pk = batch[-1]
+        drifted = model.objects.filter(pk__in=batch).annotate(
+            actual=actual_count(related_model, related_field)
+        ).exclude(**{field: F('actual')}).values_list('pk', flat=True)
+        fixed += model.objects.filter(pk__in=list(drifted)).update(
+            **{field: actual_count(related_model, related_field)}
+        )
@@ -0,0 +1,39 @@
+import json
+
+from django.contrib.postgres.fields import ArrayField
+from django.db import models
+
+
+class IntegerArrayField(ArrayField):
+    # В PostgreSQL это integer[] с операторами @> и &&. Остальные базы
+    # хранят тот же список как JSON-текст, чтобы модель работала и на
+    # SQLite, где фильтры обходятся без этой колонки.
+
+    def __init__(self, **kwargs):
+        kwargs['base_field'] = models.IntegerField()
+        super().__init__(**kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        del kwargs['base_field']
+        return name, path, args, kwargs
+
+    def db_type(self, connection):
+        if connection.vendor == 'postgresql':
+            return super().db_type(connection)
+        return 'text'
+
+    def get_placeholder(self, value, compiler, connection):
+        if connection.vendor == 'postgresql':
+            return super().get_placeholder(value, compiler, connection)
+        return '%s'
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if connection.vendor == 'postgresql' or value is None:
+            return super().get_db_prep_value(value, connection, prepared)
+        return json.dumps(list(value))
+
+    def from_db_value(self, value, expression, connection):
+        if isinstance(value, str):
+            return json.loads(value)
+        return value
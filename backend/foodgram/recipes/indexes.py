@@ -0,0 +1,28 @@
+import copy
+
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db import models
+
+
+class PortableIndex(models.Index):
+    # Классы операторов и GIN есть только в PostgreSQL. На SQLite, где
+    # запускаются разработка и тесты, под тем же именем создается обычный
+    # индекс по тем же выражениям, чтобы миграции и пересоздание таблиц
+    # не падали.
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().create_sql(model, schema_editor, using, **kwargs)
+        index = copy.copy(self)
+        index.expressions = tuple(
+            expression.get_source_expressions()[0]
+            if isinstance(expression, OpClass) else expression
+            for expression in self.expressions
+        )
+        return models.Index.create_sql(
+            index, model, schema_editor, using, **kwargs
+        )
+
+
+class PortableGinIndex(PortableIndex, GinIndex):
+    pass
@@ -0,0 +1,44 @@
+from bisect import bisect_left, bisect_right
+
+from .models import Ingredient
+from .versions import INGREDIENTS_VERSION, get_version
+
+MAX_CHAR = chr(0x10FFFF)
+
+
+class IngredientIndex:
+    def __init__(self):
+        self._state = None
+
+    def _load(self, version):
+        entries = sorted(
+            Ingredient.objects.values('id', 'name', 'measurement_unit'),
+            key=lambda entry: (entry['name'].casefold(), entry['id'])
+        )
+        keys = [entry['name'].casefold() for entry in entries]
+        return version, keys, entries
+
+    def _get_state(self):
+        version = get_version(INGREDIENTS_VERSION)
+        state = self._state
+        if state is None or state[0] != version:
+            state = self._state = self._load(version)
+        return state
+
+    def all(self):
+        return list(self._get_state()[2])
+
+    def search(self, query):
+        _, keys, entries = self._get_state()
+        query = query.casefold()
+        start = bisect_left(keys, query)
+        end = bisect_right(keys, query + MAX_CHAR, lo=start)
+        contains = [
+            entry
+            for key, entry in zip(keys, entries)
+            if query in key and not key.startswith(query)
+        ]
+        return entries[start:end] + contains
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from recipes.media import collect_garbage, reconcile_references
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет медиафайлы, на которые не ссылается ни один аватар '
+        'или рецепт. --reconcile предварительно пересчитывает ссылки '
+        'по базе данных.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reconcile', action='store_true')
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument(
+            '--grace-period',
+            type=int,
+            default=3600,
+            help='Не трогать файлы моложе указанного числа секунд.'
+        )
+
+    def handle(self, *args, **options):
+        if options['reconcile']:
+            total = reconcile_references()
+            self.stdout.write(f'Пересчитаны ссылки на {total} файлов')
+        removed = collect_garbage(
+            options['grace_period'], dry_run=options['dry_run']
+        )
+        for name in removed:
+            self.stdout.write(name)
+        action = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(
+            self.style.SUCCESS(f'{action} файлов: {len(removed)}')
+        )
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.transfer import (
+    DATASETS,
+    WRITE_FORMATS,
+    TransferError,
+    export_file
+)
+
+
+class Command(BaseCommand):
+    help = 'Потоково выгружает данные в JSONL или CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(DATASETS))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=WRITE_FORMATS)
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument(
+            '--embed-images',
+            action='store_true',
+            help='Вложить изображения в выгрузку как data URI.'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            exported = export_file(
+                DATASETS[options['dataset']],
+                options['path'],
+                format=options['format'],
+                chunk_size=options['chunk_size'],
+                embed_images=options['embed_images'],
+                progress=self.report
+            )
+        except (OSError, TransferError) as error:
+            raise CommandError(error)
+        self.stdout.write(
+            self.style.SUCCESS(f'Выгружено строк: {exported}')
+        )
+
+    def report(self, done, elapsed):
+        rate = done / elapsed if elapsed else 0
+        self.stdout.write(f'{done} строк, {rate:.0f} строк/с')
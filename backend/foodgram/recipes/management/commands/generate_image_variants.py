@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.thumbnails import generate_variants
+
+
+class Command(BaseCommand):
+    help = (
+        'Готовит WebP/AVIF превью для рецептов, у которых их ещё нет '
+        'или они устарели после смены изображения.'
+    )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').values_list(
+            'id', 'image', 'image_variants'
+        ).iterator(chunk_size=500)
+        processed = 0
+        for recipe_id, image, variants in recipes:
+            if variants.get('source') != image:
+                generate_variants(recipe_id)
+                processed += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано рецептов: {processed}')
+        )
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.transfer import DATASETS, READ_FORMATS, TransferError, import_file
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково загружает данные из JSONL/CSV пачками. На PostgreSQL '
+        'использует COPY, иначе bulk_create. После сбоя повторный запуск '
+        'продолжает с последней сохраненной пачки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(DATASETS))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=READ_FORMATS)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Не использовать COPY даже на PostgreSQL.'
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Начать сначала, не учитывая сохраненный прогресс.'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            imported = import_file(
+                DATASETS[options['dataset']],
+                options['path'],
+                format=options['format'],
+                batch_size=options['batch_size'],
+                use_copy=False if options['no_copy'] else None,
+                restart=options['restart'],
+                progress=self.report
+            )
+        except (OSError, ValueError, TransferError) as error:
+            raise CommandError(error)
+        self.stdout.write(
+            self.style.SUCCESS(f'Загружено строк: {imported}')
+        )
+
+    def report(self, done, elapsed):
+        rate = done / elapsed if elapsed else 0
+        self.stdout.write(f'{done} строк, {rate:.0f} строк/с')
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.transfer import TransferError, sync_ingredients
+
+
+class Command(BaseCommand):
+    help = (
+        'Синхронизирует справочник ингредиентов с файлом JSON, JSONL или '
+        'CSV: добавляет новые и обновляет единицы измерения. Безопасно '
+        'запускать при каждом деплое.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='../../data/ingredients.json'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать изменения, ничего не записывая.'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            summary = sync_ingredients(
+                options['path'],
+                batch_size=options['batch_size'],
+                dry_run=options['dry_run']
+            )
+        except FileNotFoundError:
+            raise CommandError(f'Файл {options["path"]} не найден')
+        except (KeyError, ValueError):
+            raise CommandError('Ошибка: Некорректный формат файла')
+        except TransferError as error:
+            raise CommandError(error)
+        prefix = 'Будет добавлено' if options['dry_run'] else 'Добавлено'
+        self.stdout.write(
+            f'{prefix}: {summary["created"]}, '
+            f'обновлено: {summary["updated"]}, '
+            f'без изменений: {summary["unchanged"]}'
+        )
+        if summary['missing']:
+            self.stdout.write(
+                f'В базе есть ингредиенты, которых нет в файле: '
+                f'{summary["missing"]} (не удаляются)'
+            )
+        self.stdout.write(self.style.SUCCESS('Справочник синхронизирован'))
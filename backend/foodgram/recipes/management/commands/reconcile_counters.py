@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from recipes.counters import COUNTERS, reconcile
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счетчики пачками.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        for model, field, related_model, related_field in COUNTERS:
+            fixed = reconcile(
+                model,
+                field,
+                related_model,
+                related_field,
+                options['batch_size']
+            )
+            self.stdout.write(
+                f'{model._meta.object_name}.{field}: исправлено {fixed}'
+            )
+        self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from recipes.popularity import rebuild, refresh
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает популярность рецептов по избранному и корзинам. '
+        'По умолчанию учитывает только новые события; --full '
+        'перестраивает таблицу целиком и учитывает удаления.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['full']:
+            updated = rebuild(options['batch_size'])
+        else:
+            updated = refresh(options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Обновлена популярность {updated} рецептов')
+        )
@@ -0,0 +1,114 @@
+import posixpath
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from .counters import change_counter
+from .models import MediaBlob, Recipe
+
+User = get_user_model()
+
+
+def variant_files(variants):
+    return {
+        name
+        for extension, widths in variants.items() if extension != 'source'
+        for name in widths.values()
+    }
+
+
+def referenced_files(instance):
+    if instance.get_deferred_fields() & {'avatar', 'image', 'image_variants'}:
+        return None
+    if isinstance(instance, Recipe):
+        files = variant_files(instance.image_variants)
+        if instance.image:
+            files.add(instance.image.name)
+        return files
+    return {instance.avatar.name} if instance.avatar else set()
+
+
+def retain(names):
+    if not names:
+        return
+    MediaBlob.objects.bulk_create(
+        [MediaBlob(name=name) for name in names], ignore_conflicts=True
+    )
+    change_counter(MediaBlob.objects.filter(name__in=names), 'references', 1)
+
+
+def release(names):
+    if names:
+        change_counter(
+            MediaBlob.objects.filter(name__in=names), 'references', -1
+        )
+
+
+def media_directories():
+    return {
+        User._meta.get_field('avatar').upload_to.strip('/'),
+        Recipe._meta.get_field('image').upload_to.strip('/'),
+    }
+
+
+def walk(directory):
+    if not default_storage.exists(directory):
+        return
+    directories, files = default_storage.listdir(directory)
+    for name in files:
+        yield posixpath.join(directory, name)
+    for subdirectory in directories:
+        yield from walk(posixpath.join(directory, subdirectory))
+
+
+def reconcile_references():
+    references = Counter()
+    for avatar in User.objects.exclude(avatar='').exclude(
+        avatar__isnull=True
+    ).values_list('avatar', flat=True).iterator():
+        references[avatar] += 1
+    for image, variants in Recipe.objects.values_list(
+        'image', 'image_variants'
+    ).iterator():
+        files = variant_files(variants)
+        if image:
+            files.add(image)
+        references.update(files)
+    with transaction.atomic():
+        MediaBlob.objects.all().delete()
+        MediaBlob.objects.bulk_create(
+            [
+                MediaBlob(name=name, references=count)
+                for name, count in references.items()
+            ],
+            batch_size=1000
+        )
+    return len(references)
+
+
+def collect_garbage(grace_period, dry_run=False):
+    # Файлы без живых ссылок удаляются только по истечении grace_period,
+    # чтобы не задеть загрузку, транзакция которой ещё не завершилась.
+    live = set(MediaBlob.objects.filter(
+        references__gt=0
+    ).values_list('name', flat=True))
+    deadline = timezone.now() - timedelta(seconds=grace_period)
+    removed = []
+    for directory in media_directories():
+        for name in walk(directory):
+            if name in live:
+                continue
+            if default_storage.get_modified_time(name) > deadline:
+                continue
+            if not dry_run:
+                default_storage.delete(name)
+            removed.append(name)
+    if not dry_run:
+        MediaBlob.objects.filter(
+            references__lte=0, updated_at__lt=deadline
+        ).delete()
+    return removed
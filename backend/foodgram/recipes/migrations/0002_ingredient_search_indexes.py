@@ -0,0 +1,33 @@
+# Generated by Django 5.2.2 on 2026-10-17 04:12
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+import django.db.models.functions.text
+import recipes.indexes
+from django.conf import settings
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='subscription',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='authors', to=settings.AUTH_USER_MODEL, verbose_name='Подписки авторов'),
+        ),
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=recipes.indexes.PortableIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='text_pattern_ops'), name='ingredient_name_prefix_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=recipes.indexes.PortableGinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='ingredient_name_trgm_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.2 on 2026-10-17 04:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_ingredient_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.2 on 2026-10-17 04:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-id'], name='recipe_author_id_desc_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.2 on 2026-10-17 04:15
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('Recipe', 'favorites_count', 'Favorite', 'recipe'),
+    ('User', 'recipes_count', 'Recipe', 'author'),
+    ('User', 'subscribers_count', 'Subscription', 'author'),
+    ('Ingredient', 'recipes_count', 'RecipeIngredient', 'ingredient'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for model_name, field, related_name, related_field in COUNTERS:
+        model = apps.get_model('recipes', model_name)
+        related = apps.get_model('recipes', related_name)
+        model.objects.update(**{field: Coalesce(Subquery(
+            related.objects.filter(
+                **{related_field: OuterRef('pk')}
+            ).order_by().values(related_field).annotate(
+                total=Count('pk')
+            ).values('total')
+        ), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_recipe_author_id_desc_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Рецептов'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Рецепты'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='subscribers_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Подписчики'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
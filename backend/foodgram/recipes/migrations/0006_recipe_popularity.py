@@ -0,0 +1,41 @@
+# Generated by Django 5.2.2 on 2026-10-17 04:16
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_denormalized_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='favorite',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.CreateModel(
+            name='RecipePopularity',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('score', models.FloatField(default=0, verbose_name='Популярность')),
+                ('recent_score', models.FloatField(default=0, verbose_name='Популярность за окно перечитывания')),
+                ('updated_at', models.DateTimeField(verbose_name='Дата пересчета')),
+            ],
+            options={
+                'verbose_name': 'Популярность рецепта',
+                'verbose_name_plural': 'Популярность рецептов',
+                'indexes': [models.Index(fields=['-score', '-recipe'], name='recipe_popularity_score_idx')],
+            },
+        ),
+    ]
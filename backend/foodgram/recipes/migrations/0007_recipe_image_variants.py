@@ -0,0 +1,18 @@
+# Generated by Django 5.2.2 on 2026-10-17 04:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_popularity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Превью изображения'),
+        ),
+    ]
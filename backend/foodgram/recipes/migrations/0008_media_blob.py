@@ -0,0 +1,58 @@
+# Generated by Django 5.2.2 on 2026-10-17 04:21
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def fill_references(apps, schema_editor):
+    User = apps.get_model('recipes', 'User')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    MediaBlob = apps.get_model('recipes', 'MediaBlob')
+    references = Counter(
+        User.objects.exclude(avatar='').exclude(
+            avatar__isnull=True
+        ).values_list('avatar', flat=True)
+    )
+    for image, variants in Recipe.objects.values_list(
+        'image', 'image_variants'
+    ):
+        files = {
+            name
+            for extension, widths in variants.items()
+            if extension != 'source'
+            for name in widths.values()
+        }
+        if image:
+            files.add(image)
+        references.update(files)
+    MediaBlob.objects.bulk_create(
+        [
+            MediaBlob(name=name, references=count)
+            for name, count in references.items()
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='Файл')),
+                ('references', models.IntegerField(default=0, verbose_name='Ссылок')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Медиафайл',
+                'verbose_name_plural': 'Медиафайлы',
+            },
+        ),
+        migrations.RunPython(fill_references, migrations.RunPython.noop),
+    ]
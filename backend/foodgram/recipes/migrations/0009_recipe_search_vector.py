@@ -0,0 +1,62 @@
+# Generated by Django 5.2.2 on 2026-10-17 04:35
+
+import django.contrib.postgres.search
+import recipes.indexes
+from django.db import migrations
+
+
+def create_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('''
+        CREATE OR REPLACE FUNCTION recipes_recipe_search_vector_update()
+        RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector :=
+                setweight(to_tsvector('russian', coalesce(NEW.name, '')), 'A')
+                || setweight(
+                    to_tsvector('russian', coalesce(NEW.text, '')), 'B'
+                );
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    ''')
+    schema_editor.execute(
+        'CREATE TRIGGER recipes_recipe_search_vector_trigger '
+        'BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe '
+        'FOR EACH ROW EXECUTE FUNCTION recipes_recipe_search_vector_update()'
+    )
+    # Пересохраняем name, чтобы триггер заполнил вектор у старых строк.
+    schema_editor.execute('UPDATE recipes_recipe SET name = name')
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'DROP TRIGGER IF EXISTS recipes_recipe_search_vector_trigger '
+        'ON recipes_recipe'
+    )
+    schema_editor.execute(
+        'DROP FUNCTION IF EXISTS recipes_recipe_search_vector_update()'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_media_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=recipes.indexes.PortableGinIndex(fields=['search_vector'], name='recipe_search_vector_idx'),
+        ),
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.2 on 2026-10-17 04:37
+
+import recipes.fields
+import recipes.indexes
+from django.db import migrations
+
+
+def fill_ingredient_ids(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'UPDATE recipes_recipe r SET ingredient_ids = ARRAY('
+            'SELECT ingredient_id FROM recipes_recipeingredient '
+            'WHERE recipe_id = r.id ORDER BY ingredient_id)'
+        )
+        return
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ingredient_ids = {}
+    for recipe_id, ingredient_id in RecipeIngredient.objects.order_by(
+        'recipe_id', 'ingredient_id'
+    ).values_list('recipe_id', 'ingredient_id').iterator():
+        ingredient_ids.setdefault(recipe_id, []).append(ingredient_id)
+    Recipe.objects.bulk_update(
+        [
+            Recipe(pk=recipe_id, ingredient_ids=ids)
+            for recipe_id, ids in ingredient_ids.items()
+        ],
+        ['ingredient_ids'],
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_ids',
+            field=recipes.fields.IntegerArrayField(blank=True, default=list, editable=False, size=None, verbose_name='Id ингредиентов'),
+        ),
+        migrations.RunPython(fill_ingredient_ids, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=recipes.indexes.PortableGinIndex(fields=['ingredient_ids'], name='recipe_ingredient_ids_idx'),
+        ),
+    ]
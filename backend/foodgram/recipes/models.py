@@ -1,7 +1,13 @@
 from django.db import models
 from django.core.validators import MinValueValidator
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import RegexValidator
+from django.db.models.functions import Upper
+
+from .fields import IntegerArrayField
+from .indexes import PortableGinIndex, PortableIndex
 
 MIN_VALUE_COOKING_TIME = 1
 MIN_VALUE_INGREDIENTS_COUNT = 1
@@ -17,11 +23,26 @@ class Ingredient(models.Model):
         max_length=64,
         verbose_name='Единица измерения'
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Рецептов'
+    )
 
     class Meta:
         verbose_name = 'Ингредиенты'
         verbose_name_plural = 'Ингредиенты'
         ordering = ['name']
+        indexes = [
+            # name__istartswith и name__icontains сравнивают UPPER(name).
+            PortableIndex(
+                OpClass(Upper('name'), name='text_pattern_ops'),
+                name='ingredient_name_prefix_idx'
+            ),
+            PortableGinIndex(
+                OpClass(Upper('name'), name='gin_trgm_ops'),
+                name='ingredient_name_trgm_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.name} ({self.measurement_unit})'
@@ -59,6 +80,14 @@ class User(AbstractUser):
         null=True,
         upload_to="recipes/avatars/",
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Рецепты'
+    )
+    subscribers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписчики'
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'last_name', 'first_name']
@@ -114,6 +143,10 @@ class Favorite(models.Model):
         related_name='in_favorites',
         verbose_name='Рецепт'
     )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата добавления'
+    )
 
     class Meta:
         verbose_name = 'Избранное'
@@ -144,6 +177,10 @@ class ShoppingCart(models.Model):
         related_name="shopping_carts",
         verbose_name="Рецепт",
     )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата добавления'
+    )
 
     class Meta:
         verbose_name = 'Список покупок'
@@ -177,6 +214,12 @@ class Recipe(models.Model):
         verbose_name='Изображение рецепта',
         upload_to='recipes/images'
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Превью изображения'
+    )
     ingredients = models.ManyToManyField(
         Ingredient,
         through='RecipeIngredient',
@@ -189,6 +232,45 @@ class Recipe(models.Model):
         related_name="recipes",
         verbose_name="Автор",
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='В избранном'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+    # Заполняется триггером в PostgreSQL (см. миграцию 0009), поэтому
+    # актуален и после bulk_create и COPY.
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор'
+    )
+    # Копия id ингредиентов из RecipeIngredient для фильтров по составу,
+    # ее обновляет RecipeSerializer.push_ingredients.
+    ingredient_ids = IntegerArrayField(
+        default=list,
+        blank=True,
+        editable=False,
+        verbose_name='Id ингредиентов'
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['author', '-id'],
+                name='recipe_author_id_desc_idx'
+            ),
+            PortableGinIndex(
+                fields=['search_vector'],
+                name='recipe_search_vector_idx'
+            ),
+            PortableGinIndex(
+                fields=['ingredient_ids'],
+                name='recipe_ingredient_ids_idx'
+            ),
+        ]
 
 
 class RecipeIngredient(models.Model):
@@ -223,3 +305,60 @@ class RecipeIngredient(models.Model):
     def __str__(self):
         return (f'{self.ingredient.name} в рецепте '
                 f'{self.recipe.name} - {self.amount}')
+
+
+class RecipePopularity(models.Model):
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='popularity',
+        verbose_name='Рецепт'
+    )
+    score = models.FloatField(
+        default=0,
+        verbose_name='Популярность'
+    )
+    recent_score = models.FloatField(
+        default=0,
+        verbose_name='Популярность за окно перечитывания'
+    )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата пересчета'
+    )
+
+    class Meta:
+        verbose_name = 'Популярность рецепта'
+        verbose_name_plural = 'Популярность рецептов'
+        indexes = [
+            models.Index(
+                fields=['-score', '-recipe'],
+                name='recipe_popularity_score_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.score:.2f}'
+
+
+class MediaBlob(models.Model):
+    name = models.CharField(
+        max_length=255,
+        primary_key=True,
+        verbose_name='Файл'
+    )
+    references = models.IntegerField(
+        default=0,
+        verbose_name='Ссылок'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+
+    class Meta:
+        verbose_name = 'Медиафайл'
+        verbose_name_plural = 'Медиафайлы'
+
+    def __str__(self):
+        return f'{self.name} ({self.references})'
@@ -0,0 +1,117 @@
+from collections import defaultdict
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .models import Favorite, RecipePopularity, ShoppingCart
+from .versions import POPULARITY_VERSION, bump_version
+
+EVENT_WEIGHTS = (
+    (Favorite, 1.0),
+    (ShoppingCart, 0.5),
+)
+
+
+def decay_factor(seconds):
+    half_life = settings.POPULARITY_HALF_LIFE_DAYS * 24 * 60 * 60
+    return 0.5 ** (seconds / half_life)
+
+
+def _batches(iterable, batch_size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+
+def _save_scores(scores, recent, now, batch_size, additive):
+    for recipe_ids in _batches(scores, batch_size):
+        existing = {}
+        if additive:
+            existing = dict(RecipePopularity.objects.filter(
+                recipe_id__in=recipe_ids
+            ).values_list('recipe_id', 'score'))
+        RecipePopularity.objects.bulk_create(
+            (
+                RecipePopularity(
+                    recipe_id=recipe_id,
+                    score=existing.get(recipe_id, 0) + scores[recipe_id],
+                    recent_score=recent.get(recipe_id, 0),
+                    updated_at=now,
+                )
+                for recipe_id in recipe_ids
+            ),
+            update_conflicts=True,
+            unique_fields=['recipe'],
+            update_fields=['score', 'recent_score', 'updated_at'],
+        )
+
+
+def _event_scores(now, batch_size, cutoff, **filters):
+    # Вместе с суммой считается вклад событий новее cutoff: при следующем
+    # пересчете они будут перечитаны заново.
+    scores = defaultdict(float)
+    recent = defaultdict(float)
+    for model, weight in EVENT_WEIGHTS:
+        events = model.objects.filter(
+            created_at__lte=now, **filters
+        ).values_list('recipe_id', 'created_at').iterator(
+            chunk_size=batch_size
+        )
+        for recipe_id, created_at in events:
+            score = weight * decay_factor((now - created_at).total_seconds())
+            scores[recipe_id] += score
+            if created_at > cutoff:
+                recent[recipe_id] += score
+    return scores, recent
+
+
+def _overlap():
+    return timedelta(seconds=settings.POPULARITY_REFRESH_OVERLAP)
+
+
+def rebuild(batch_size=1000, now=None):
+    now = now or timezone.now()
+    scores, recent = _event_scores(now, batch_size, now - _overlap())
+
+    with transaction.atomic():
+        RecipePopularity.objects.all().delete()
+        _save_scores(scores, recent, now, batch_size, additive=False)
+        transaction.on_commit(lambda: bump_version(POPULARITY_VERSION))
+    return len(scores)
+
+
+def refresh(batch_size=1000, now=None):
+    now = now or timezone.now()
+    watermark = RecipePopularity.objects.aggregate(
+        last_refresh=Max('updated_at')
+    )['last_refresh']
+    if watermark is None:
+        return rebuild(batch_size, now)
+
+    # created_at ставится до коммита, и событие с меткой раньше прошлого
+    # пересчета могло стать видимым уже после него. Поэтому события за
+    # POPULARITY_REFRESH_OVERLAP перед прошлым пересчетом перечитываются,
+    # а их прежний вклад (recent_score) вычитается. Старые очки затухают
+    # за время с прошлого пересчета, новые события получают затухание по
+    # своему возрасту, как в rebuild. Удаления из избранного и корзины
+    # подхватывает только rebuild.
+    added, recent = _event_scores(
+        now, batch_size, now - _overlap(),
+        created_at__gt=watermark - _overlap()
+    )
+
+    with transaction.atomic():
+        RecipePopularity.objects.update(
+            score=(F('score') - F('recent_score')) * decay_factor(
+                (now - watermark).total_seconds()
+            ),
+            recent_score=0,
+            updated_at=now,
+        )
+        _save_scores(added, recent, now, batch_size, additive=True)
+        transaction.on_commit(lambda: bump_version(POPULARITY_VERSION))
+    return len(added)
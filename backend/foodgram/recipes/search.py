@@ -0,0 +1,70 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import Case, Count, F, FloatField, Q, Value, When
+
+from .models import Recipe, RecipeIngredient
+
+SEARCH_CONFIG = 'russian'
+MATCH_ALL = 'all'
+MATCH_ANY = 'any'
+
+
+def search_recipes(queryset, text):
+    if connections[queryset.db].vendor == 'postgresql':
+        query = SearchQuery(
+            text, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query)
+        ).order_by('-search_rank', '-id')
+    # Без PostgreSQL ищем подстроку без морфологии, но так же ставим
+    # совпадения в названии выше совпадений в описании.
+    return queryset.filter(
+        Q(name__icontains=text) | Q(text__icontains=text)
+    ).annotate(
+        search_rank=Case(
+            When(name__icontains=text, then=Value(1.0)),
+            default=Value(0.4),
+            output_field=FloatField()
+        )
+    ).order_by('-search_rank', '-id')
+
+
+def refresh_ingredient_ids(recipe_ids):
+    ingredient_ids = {recipe_id: [] for recipe_id in recipe_ids}
+    for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by('ingredient_id').values_list('recipe_id', 'ingredient_id'):
+        ingredient_ids[recipe_id].append(ingredient_id)
+    Recipe.objects.bulk_update(
+        [
+            Recipe(pk=recipe_id, ingredient_ids=ids)
+            for recipe_id, ids in ingredient_ids.items()
+        ],
+        ['ingredient_ids']
+    )
+
+
+def _recipes_with(ingredient_ids):
+    return RecipeIngredient.objects.filter(
+        ingredient_id__in=ingredient_ids
+    ).values('recipe_id')
+
+
+def filter_by_ingredients(queryset, ingredient_ids, match=MATCH_ALL):
+    if connections[queryset.db].vendor == 'postgresql':
+        # @> и && по GIN-индексу на ingredient_ids.
+        if match == MATCH_ANY:
+            return queryset.filter(ingredient_ids__overlap=ingredient_ids)
+        return queryset.filter(ingredient_ids__contains=ingredient_ids)
+    if match == MATCH_ANY:
+        return queryset.filter(pk__in=_recipes_with(ingredient_ids))
+    return queryset.filter(pk__in=_recipes_with(ingredient_ids).annotate(
+        matched=Count('ingredient_id', distinct=True)
+    ).filter(matched=len(set(ingredient_ids))).values('recipe_id'))
+
+
+def exclude_ingredients(queryset, ingredient_ids):
+    if connections[queryset.db].vendor == 'postgresql':
+        return queryset.exclude(ingredient_ids__overlap=ingredient_ids)
+    return queryset.exclude(pk__in=_recipes_with(ingredient_ids))
@@ -0,0 +1,61 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .media import referenced_files, release, retain
+from .models import Ingredient, Recipe
+from .thumbnails import schedule_variants
+from .versions import INGREDIENTS_VERSION, bump_recipes_version, bump_version
+
+User = get_user_model()
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def bump_ingredients_version(sender, **kwargs):
+    transaction.on_commit(lambda: bump_version(INGREDIENTS_VERSION))
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: bump_recipes_version(instance.author_id))
+
+
+@receiver(post_save, sender=Recipe)
+def schedule_image_variants(sender, instance, **kwargs):
+    if instance.image and (
+        instance.image_variants.get('source') != instance.image.name
+    ):
+        transaction.on_commit(lambda: schedule_variants(instance.pk))
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    transaction.on_commit(lambda: bump_recipes_version(instance.pk))
+
+
+@receiver(post_init, sender=Recipe)
+@receiver(post_init, sender=User)
+def remember_media_files(sender, instance, **kwargs):
+    instance._media_files = referenced_files(instance)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def update_media_references(sender, instance, **kwargs):
+    old_files = instance._media_files
+    new_files = referenced_files(instance)
+    if old_files is None or new_files is None:
+        return
+    retain(new_files - old_files)
+    release(old_files - new_files)
+    instance._media_files = new_files
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=User)
+def release_media_files(sender, instance, **kwargs):
+    if instance._media_files:
+        release(instance._media_files)
@@ -0,0 +1,46 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    # Имя файла определяется его содержимым, поэтому повторная загрузка
+    # той же картинки не пишет на диск ничего нового. Удалять файлы
+    # напрямую нельзя: один и тот же файл может принадлежать нескольким
+    # объектам, сироты убирает команда collect_media.
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('allow_overwrite', True)
+        super().__init__(**kwargs)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = content_hash(content)
+        name = posixpath.join(
+            posixpath.dirname(name),
+            digest[:2],
+            digest + posixpath.splitext(name)[1].lower()
+        )
+        # Сборщик мусора щадит файлы моложе grace_period. Повторно
+        # использованный файл мог давно остаться без ссылок, поэтому
+        # обновляем mtime, пока транзакция с новой ссылкой не завершилась.
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return super().save(name, content, max_length)
+        return name
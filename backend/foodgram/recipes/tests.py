@@ -0,0 +1,391 @@
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from . import popularity
+from .counters import COUNTERS, change_counter, reconcile
+from .media import collect_garbage
+from .thumbnails import available_formats, build_variants
+from .transfer import Checkpoint, sync_ingredients
+from .versions import INGREDIENTS_VERSION, get_version
+from .models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipePopularity,
+    ShoppingCart,
+    Subscription
+)
+
+User = get_user_model()
+
+
+def create_user(index):
+    return User.objects.create_user(
+        email=f'user{index}@example.com',
+        username=f'user{index}',
+        first_name='Имя',
+        last_name='Фамилия',
+        password='pass12345!'
+    )
+
+
+def create_recipe(author, ingredients=(), name='Рецепт'):
+    recipe = Recipe.objects.create(
+        author=author,
+        name=name,
+        text='Описание',
+        cooking_time=5,
+        image='recipes/images/recipe.png'
+    )
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=2)
+        for ingredient in ingredients
+    )
+    return recipe
+
+
+class CounterTests(TestCase):
+
+    def setUp(self):
+        self.user = create_user(1)
+        self.author = create_user(2)
+        self.ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г'
+        )
+        self.recipe = create_recipe(self.author)
+
+    def test_change_counter_does_not_go_below_zero(self):
+        recipes = Recipe.objects.filter(pk=self.recipe.pk)
+
+        change_counter(recipes, 'favorites_count', -1)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+
+        change_counter(recipes, 'favorites_count', 2)
+        change_counter(recipes, 'favorites_count', -1)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+
+    def test_reconcile_fixes_drift(self):
+        # Создание через ORM обходит счетчики, как и админка.
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        Subscription.objects.create(user=self.user, author=self.author)
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, ingredient=self.ingredient, amount=1
+        )
+        User.objects.filter(pk=self.user.pk).update(recipes_count=5)
+
+        fixed = sum(
+            reconcile(model, field, related_model, related_field, 1)
+            for model, field, related_model, related_field in COUNTERS
+        )
+
+        self.assertEqual(fixed, 5)
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.user.refresh_from_db()
+        self.ingredient.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.assertEqual(self.author.recipes_count, 1)
+        self.assertEqual(self.author.subscribers_count, 1)
+        self.assertEqual(self.user.recipes_count, 0)
+        self.assertEqual(self.ingredient.recipes_count, 1)
+        self.assertEqual(
+            sum(
+                reconcile(model, field, related_model, related_field, 1)
+                for model, field, related_model, related_field in COUNTERS
+            ),
+            0
+        )
+
+
+class PopularityTests(TestCase):
+
+    def setUp(self):
+        self.now = timezone.now()
+        author = create_user(0)
+        self.recipes = [
+            create_recipe(author, name=f'Рецепт {index}')
+            for index in range(3)
+        ]
+        self.users = [create_user(index) for index in range(1, 5)]
+
+    def add_event(self, model, user, recipe, days_ago):
+        event = model.objects.create(user=user, recipe=recipe)
+        model.objects.filter(pk=event.pk).update(
+            created_at=self.now - timedelta(days=days_ago)
+        )
+
+    def scores(self):
+        return dict(
+            RecipePopularity.objects.values_list('recipe_id', 'score')
+        )
+
+    def test_refresh_matches_rebuild(self):
+        first, second, third = self.recipes
+        self.add_event(Favorite, self.users[0], first, 20)
+        self.add_event(ShoppingCart, self.users[1], first, 15)
+        self.add_event(Favorite, self.users[1], second, 12)
+        popularity.rebuild(now=self.now - timedelta(days=10))
+
+        self.add_event(Favorite, self.users[2], first, 8)
+        self.add_event(Favorite, self.users[3], third, 3)
+        self.add_event(ShoppingCart, self.users[2], second, 1)
+        popularity.refresh(now=self.now - timedelta(days=5))
+        self.add_event(Favorite, self.users[2], second, 2)
+        popularity.refresh(now=self.now)
+
+        self.assert_matches_rebuild()
+
+    def test_refresh_counts_events_committed_late(self):
+        first, second, _ = self.recipes
+        self.add_event(Favorite, self.users[0], first, 3)
+        popularity.rebuild(now=self.now - timedelta(days=1))
+
+        # Метки времени раньше прошлого пересчета, а записи стали видны
+        # только после него.
+        self.add_event(Favorite, self.users[1], first, 1 + 1 / 24 / 60)
+        self.add_event(ShoppingCart, self.users[1], second, 1 + 5 / 24 / 60)
+        popularity.refresh(now=self.now)
+
+        self.assert_matches_rebuild()
+
+    def assert_matches_rebuild(self):
+        refreshed = self.scores()
+        popularity.rebuild(now=self.now)
+        rebuilt = self.scores()
+
+        self.assertEqual(refreshed.keys(), rebuilt.keys())
+        for recipe_id, score in rebuilt.items():
+            self.assertAlmostEqual(refreshed[recipe_id], score)
+
+
+class TemporaryMediaMixin:
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(MEDIA_ROOT=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+
+class ContentAddressedStorageTests(TemporaryMediaMixin, TestCase):
+
+    def save(self):
+        return default_storage.save(
+            'recipes/images/recipe.png', ContentFile(b'image')
+        )
+
+    def test_same_content_is_stored_once(self):
+        name = self.save()
+
+        self.assertEqual(self.save(), name)
+        self.assertEqual(
+            os.listdir(os.path.dirname(default_storage.path(name))),
+            [os.path.basename(name)]
+        )
+
+    def test_reused_orphan_survives_garbage_collection(self):
+        name = self.save()
+        hour_ago = time.time() - 3600
+        os.utime(default_storage.path(name), (hour_ago, hour_ago))
+
+        self.assertEqual(self.save(), name)
+
+        self.assertEqual(collect_garbage(grace_period=600), [])
+        self.assertTrue(default_storage.exists(name))
+
+
+class ImageVariantsTests(TemporaryMediaMixin, TestCase):
+
+    def test_every_available_format_is_built(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (700, 350), 'orange').save(buffer, 'PNG')
+        source = default_storage.save(
+            'recipes/images/recipe.png', ContentFile(buffer.getvalue())
+        )
+
+        variants = build_variants(source)
+
+        self.assertIn('avif', available_formats())
+        self.assertEqual(set(variants) - {'source'}, set(available_formats()))
+        for extension in available_formats():
+            self.assertEqual(set(variants[extension]), {'320', '640'})
+            with default_storage.open(variants[extension]['320']) as file:
+                with Image.open(file) as image:
+                    self.assertEqual(image.format, extension.upper())
+                    self.assertEqual(image.size, (320, 160))
+
+
+class TransferTests(TemporaryMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.salt, self.flour = Ingredient.objects.bulk_create([
+            Ingredient(name='соль', measurement_unit='г'),
+            Ingredient(name='мука', measurement_unit='кг'),
+        ])
+        self.user, self.author = create_user(1), create_user(2)
+        self.recipes = [
+            create_recipe(self.author, [self.salt, self.flour], 'Хлеб'),
+            create_recipe(self.author, [self.salt], 'Суп\tс\nсолью'),
+        ]
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def snapshot(self):
+        return {
+            model: list(model.objects.order_by('pk').values(*columns))
+            for model, columns in (
+                (Ingredient, ('id', 'name', 'measurement_unit')),
+                (User, ('id', 'email', 'username', 'password')),
+                (Recipe, ('id', 'author_id', 'name', 'text', 'image')),
+                (
+                    RecipeIngredient,
+                    ('recipe_id', 'ingredient_id', 'amount')
+                ),
+                (Favorite, ('user_id', 'recipe_id')),
+            )
+        }
+
+    def round_trip(self, format):
+        datasets = ('ingredients', 'users', 'recipes', 'favorites')
+        before = self.snapshot()
+        for dataset in datasets:
+            call_command(
+                'export_data', dataset, self.path(f'{dataset}.{format}'),
+                stdout=io.StringIO()
+            )
+        for model in (Favorite, Recipe, User, Ingredient):
+            model.objects.all().delete()
+
+        for dataset in datasets:
+            call_command(
+                'import_data', dataset, self.path(f'{dataset}.{format}'),
+                stdout=io.StringIO()
+            )
+
+        self.assertEqual(self.snapshot(), before)
+        recipe = Recipe.objects.get(pk=self.recipes[0].pk)
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(
+            list(recipe.ingredient_ids), sorted([self.salt.pk, self.flour.pk])
+        )
+        self.assertEqual(User.objects.get(pk=self.author.pk).recipes_count, 2)
+        self.assertTrue(
+            User.objects.get(pk=self.user.pk).check_password('pass12345!')
+        )
+
+    def test_jsonl_round_trip(self):
+        self.round_trip('jsonl')
+
+    def test_csv_round_trip(self):
+        self.round_trip('csv')
+
+    def test_import_resumes_from_checkpoint(self):
+        path = self.path('ingredients.jsonl')
+        call_command(
+            'export_data', 'ingredients', path, stdout=io.StringIO()
+        )
+        Ingredient.objects.exclude(pk=self.salt.pk).delete()
+        Checkpoint(path, 'ingredients').save(1)
+        self.salt.name = 'соль морская'
+        self.salt.save()
+
+        call_command(
+            'import_data', 'ingredients', path, '--batch-size', '1',
+            stdout=io.StringIO()
+        )
+
+        self.assertEqual(
+            list(Ingredient.objects.order_by('pk').values_list('name')),
+            [('соль морская',), ('мука',)]
+        )
+        self.assertFalse(os.path.exists(f'{path}.checkpoint'))
+
+
+class IngredientSyncTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'ingredients.json')
+        Ingredient.objects.create(name='перец', measurement_unit='г')
+
+    def sync(self, rows, **kwargs):
+        with open(self.path, 'w', encoding='utf-8') as file:
+            json.dump(rows, file, ensure_ascii=False)
+        return sync_ingredients(self.path, **kwargs)
+
+    def catalogue(self):
+        return dict(
+            Ingredient.objects.values_list('name', 'measurement_unit')
+        )
+
+    def test_sync_is_idempotent(self):
+        rows = [
+            {'name': 'соль', 'measurement_unit': 'г'},
+            {'name': ' мука ', 'measurement_unit': 'кг'},
+            {'name': 'соль', 'measurement_unit': 'г'},
+        ]
+
+        self.assertEqual(
+            self.sync(rows),
+            {'created': 2, 'updated': 0, 'unchanged': 0, 'missing': 1}
+        )
+        version = get_version(INGREDIENTS_VERSION)
+        ids = set(Ingredient.objects.values_list('pk', flat=True))
+
+        self.assertEqual(
+            self.sync(rows),
+            {'created': 0, 'updated': 0, 'unchanged': 2, 'missing': 1}
+        )
+        self.assertEqual(get_version(INGREDIENTS_VERSION), version)
+        self.assertEqual(
+            set(Ingredient.objects.values_list('pk', flat=True)), ids
+        )
+        self.assertEqual(
+            self.catalogue(), {'перец': 'г', 'соль': 'г', 'мука': 'кг'}
+        )
+
+    def test_changed_unit_updates_row_in_place(self):
+        pepper = Ingredient.objects.get(name='перец')
+
+        summary = self.sync([{'name': 'перец', 'measurement_unit': 'щепоть'}])
+
+        self.assertEqual(summary['updated'], 1)
+        self.assertEqual(
+            Ingredient.objects.get(pk=pepper.pk).measurement_unit, 'щепоть'
+        )
+
+    def test_dry_run_writes_nothing(self):
+        summary = self.sync(
+            [
+                {'name': 'соль', 'measurement_unit': 'г'},
+                {'name': 'перец', 'measurement_unit': 'щепоть'},
+            ],
+            dry_run=True
+        )
+
+        self.assertEqual((summary['created'], summary['updated']), (1, 1))
+        self.assertEqual(self.catalogue(), {'перец': 'г'})
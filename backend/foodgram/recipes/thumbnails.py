@@ -0,0 +1,108 @@
+import io
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, features
+
+from .media import release, retain, variant_files
+from .models import Recipe
+from .versions import bump_recipes_version
+
+logger = logging.getLogger(__name__)
+
+VARIANT_FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'avif': {'format': 'AVIF', 'quality': 60},
+}
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_PIPELINE_WORKERS,
+            thread_name_prefix='image-variants'
+        )
+    return _executor
+
+
+def variant_name(source, width, extension):
+    directory, filename = posixpath.split(source)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(
+        directory, 'variants', f'{stem}-{width}.{extension}'
+    )
+
+
+def available_formats():
+    return [
+        extension for extension in VARIANT_FORMATS
+        if features.check(extension)
+    ]
+
+
+def build_variants(source):
+    variants = {'source': source}
+    with default_storage.open(source) as file, Image.open(file) as image:
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        for width in settings.IMAGE_VARIANT_WIDTHS:
+            if width >= image.width:
+                continue
+            height = round(image.height * width / image.width)
+            resized = image.resize((width, height), Image.Resampling.LANCZOS)
+            for extension in available_formats():
+                buffer = io.BytesIO()
+                resized.save(buffer, **VARIANT_FORMATS[extension])
+                name = default_storage.save(
+                    variant_name(source, width, extension),
+                    ContentFile(buffer.getvalue())
+                )
+                variants.setdefault(extension, {})[str(width)] = name
+    return variants
+
+
+def generate_variants(recipe_id):
+    try:
+        recipe = Recipe.objects.filter(pk=recipe_id).values(
+            'image', 'image_variants', 'author_id'
+        ).first()
+        if (
+            recipe is None
+            or recipe['image_variants'].get('source') == recipe['image']
+        ):
+            return
+        variants = build_variants(recipe['image'])
+        with transaction.atomic():
+            updated = Recipe.objects.filter(
+                pk=recipe_id, image=recipe['image']
+            ).update(image_variants=variants)
+            if updated:
+                retain(variant_files(variants))
+                release(variant_files(recipe['image_variants']))
+        if updated:
+            bump_recipes_version(recipe['author_id'])
+    except Exception:
+        logger.exception(
+            'Не удалось подготовить превью рецепта %s', recipe_id
+        )
+
+
+def _generate_in_worker(recipe_id):
+    try:
+        generate_variants(recipe_id)
+    finally:
+        connections.close_all()
+
+
+def schedule_variants(recipe_id):
+    if settings.IMAGE_PIPELINE_WORKERS:
+        get_executor().submit(_generate_in_worker, recipe_id)
+    else:
+        generate_variants(recipe_id)
@@ -0,0 +1,512 @@
+import base64
+import csv
+import io
+import json
+import mimetypes
+import os
+import posixpath
+import time
+from datetime import date, datetime
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.color import no_style
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from .counters import COUNTERS, reconcile
+from .media import reconcile_references
+from .models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Subscription
+)
+from .versions import (
+    INGREDIENTS_VERSION,
+    RECIPES_VERSION,
+    author_recipes_version,
+    bump_version
+)
+
+User = get_user_model()
+
+READ_FORMATS = ('jsonl', 'csv', 'json')
+WRITE_FORMATS = ('jsonl', 'csv')
+COPY_ESCAPES = str.maketrans({
+    '\\': '\\\\',
+    '\t': '\\t',
+    '\n': '\\n',
+    '\r': '\\r',
+})
+
+
+class TransferError(Exception):
+    pass
+
+
+def detect_format(path, format=None, formats=READ_FORMATS):
+    if format is None:
+        format = os.path.splitext(path)[1].lstrip('.').lower()
+        if format == 'ndjson':
+            format = 'jsonl'
+    if format not in formats:
+        raise TransferError(
+            f'Неизвестный формат файла {path}, '
+            f'поддерживаются: {", ".join(formats)}'
+        )
+    return format
+
+
+def read_rows(path, format, columns):
+    with open(path, encoding='utf-8', newline='') as file:
+        if format == 'jsonl':
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        elif format == 'json':
+            yield from json.load(file)
+        else:
+            reader = csv.reader(file)
+            header = next(reader, None)
+            if header is None:
+                return
+            if set(header) <= set(columns):
+                fieldnames = header
+            else:
+                # Файл без заголовка: колонки идут в порядке выгрузки,
+                # первая строка уже содержит данные.
+                fieldnames = [
+                    column for column in columns if column != 'id'
+                ]
+                yield dict(zip(fieldnames, header))
+            for values in reader:
+                yield dict(zip(fieldnames, values))
+
+
+def save_data_uri(value, upload_to):
+    format, data = value.split(';base64,')
+    extension = format.split('/')[-1]
+    return default_storage.save(
+        posixpath.join(upload_to, f'import.{extension}'),
+        ContentFile(base64.b64decode(data))
+    )
+
+
+def data_uri(name):
+    content_type = mimetypes.guess_type(name)[0] or 'image/png'
+    with default_storage.open(name) as file:
+        data = base64.b64encode(file.read()).decode()
+    return f'data:{content_type};base64,{data}'
+
+
+def copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, tuple):
+        # Кортежи пишем массивом PostgreSQL, списки и словари — JSON.
+        value = '{%s}' % ','.join(map(str, value))
+    elif isinstance(value, (dict, list)):
+        value = json.dumps(value, ensure_ascii=False)
+    elif isinstance(value, (date, datetime)):
+        value = value.isoformat()
+    return str(value).translate(COPY_ESCAPES)
+
+
+class BulkCreateWriter:
+    def insert(self, model, rows):
+        model.objects.bulk_create(
+            [model(**row) for row in rows], ignore_conflicts=True
+        )
+
+
+class CopyWriter:
+    # COPY не умеет пропускать конфликты, поэтому пачка сначала
+    # заливается во временную таблицу, а оттуда переносится через
+    # INSERT ... ON CONFLICT DO NOTHING. Так повторный запуск после
+    # сбоя не падает на уже загруженных строках.
+
+    def __init__(self):
+        self.staging_tables = set()
+
+    def insert(self, model, rows):
+        quote_name = connection.ops.quote_name
+        table = model._meta.db_table
+        staging = quote_name(f'{table}_import')
+        columns = ', '.join(quote_name(column) for column in rows[0])
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write('\t'.join(map(copy_value, row.values())) + '\n')
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            if table not in self.staging_tables:
+                cursor.execute(
+                    f'CREATE TEMPORARY TABLE {staging} AS '
+                    f'SELECT * FROM {quote_name(table)} WITH NO DATA'
+                )
+                self.staging_tables.add(table)
+            copy_sql = f'COPY {staging} ({columns}) FROM STDIN'
+            if hasattr(cursor, 'copy_expert'):
+                cursor.copy_expert(copy_sql, buffer)
+            else:
+                # psycopg 3
+                with cursor.copy(copy_sql) as copy:
+                    copy.write(buffer.getvalue())
+            cursor.execute(
+                f'INSERT INTO {quote_name(table)} ({columns}) '
+                f'SELECT {columns} FROM {staging} ON CONFLICT DO NOTHING'
+            )
+            cursor.execute(f'TRUNCATE {staging}')
+
+
+class Checkpoint:
+    def __init__(self, path, name):
+        self.path = f'{path}.checkpoint'
+        self.name = name
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                state = json.load(file)
+        except FileNotFoundError:
+            return 0
+        if state.get('dataset') != self.name:
+            raise TransferError(
+                f'{self.path} относится к выгрузке {state.get("dataset")}'
+            )
+        return state['rows']
+
+    def save(self, rows):
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as file:
+            json.dump({'dataset': self.name, 'rows': rows}, file)
+        os.replace(temporary, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class Dataset:
+    name = None
+    model = None
+    columns = ()
+
+    def clean(self, row):
+        values = {}
+        for field in self.model._meta.concrete_fields:
+            value = row.get(field.attname)
+            if field.attname not in self.columns or value in (None, ''):
+                if field.primary_key:
+                    continue
+                if getattr(field, 'auto_now', False) or getattr(
+                    field, 'auto_now_add', False
+                ):
+                    value = timezone.now()
+                elif field.has_default():
+                    value = field.get_default()
+                elif field.null:
+                    value = None
+                else:
+                    value = ''
+            elif isinstance(field, models.FileField) and value.startswith(
+                'data:'
+            ):
+                value = save_data_uri(value, field.upload_to)
+            else:
+                value = field.to_python(value)
+            values[field.attname] = value
+        return values
+
+    def import_batch(self, writer, rows):
+        cleaned = [self.clean(row) for row in rows]
+        with_pk = {self.model._meta.pk.attname in row for row in cleaned}
+        if len(with_pk) > 1:
+            raise TransferError(
+                'Колонка id должна быть заполнена во всех строках '
+                'пачки или ни в одной'
+            )
+        writer.insert(self.model, cleaned)
+
+    def finish(self):
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                no_style(), self.touched_models()
+            ):
+                cursor.execute(sql)
+        for model, field, related_model, related_field in COUNTERS:
+            if related_model in self.touched_models():
+                reconcile(model, field, related_model, related_field, 1000)
+        bump_version(RECIPES_VERSION)
+
+    def touched_models(self):
+        return [self.model]
+
+    def queryset(self):
+        return self.model.objects.order_by('pk')
+
+    def export_rows(self, chunk_size, embed_images=False):
+        for values in self.queryset().values_list(*self.columns).iterator(
+            chunk_size=chunk_size
+        ):
+            yield dict(zip(self.columns, values))
+
+
+class IngredientDataset(Dataset):
+    name = 'ingredients'
+    model = Ingredient
+    columns = ('id', 'name', 'measurement_unit')
+
+    def finish(self):
+        super().finish()
+        bump_version(INGREDIENTS_VERSION)
+
+
+class UserDataset(Dataset):
+    name = 'users'
+    model = User
+    columns = (
+        'id',
+        'email',
+        'username',
+        'first_name',
+        'last_name',
+        'password',
+        'avatar',
+        'is_active',
+        'is_staff',
+        'is_superuser',
+        'date_joined',
+    )
+
+    def clean(self, row):
+        values = super().clean(row)
+        if not values['password']:
+            values['password'] = make_password(None)
+        return values
+
+    def finish(self):
+        super().finish()
+        reconcile_references()
+
+    def export_rows(self, chunk_size, embed_images=False):
+        for row in super().export_rows(chunk_size):
+            if embed_images and row['avatar']:
+                row['avatar'] = data_uri(row['avatar'])
+            yield row
+
+
+class RecipeDataset(Dataset):
+    name = 'recipes'
+    model = Recipe
+    columns = (
+        'id',
+        'author_id',
+        'name',
+        'text',
+        'cooking_time',
+        'image',
+        'ingredients',
+    )
+
+    @staticmethod
+    def ingredients(row):
+        ingredients = row.get('ingredients') or []
+        if isinstance(ingredients, str):
+            ingredients = json.loads(ingredients)
+        return ingredients
+
+    def clean(self, row):
+        values = super().clean(row)
+        values['ingredient_ids'] = tuple(sorted(
+            {ingredient['id'] for ingredient in self.ingredients(row)}
+        ))
+        return values
+
+    def import_batch(self, writer, rows):
+        if any(not row.get('id') for row in rows):
+            raise TransferError('Для импорта рецептов нужна колонка id')
+        super().import_batch(writer, rows)
+        recipe_ingredients = []
+        for row in rows:
+            recipe_ingredients.extend(
+                {
+                    'recipe_id': int(row['id']),
+                    'ingredient_id': ingredient['id'],
+                    'amount': ingredient['amount'],
+                }
+                for ingredient in self.ingredients(row)
+            )
+        if recipe_ingredients:
+            writer.insert(RecipeIngredient, recipe_ingredients)
+        for author_id in {row['author_id'] for row in rows}:
+            bump_version(author_recipes_version(author_id))
+
+    def finish(self):
+        super().finish()
+        reconcile_references()
+
+    def touched_models(self):
+        return [Recipe, RecipeIngredient]
+
+    def export_rows(self, chunk_size, embed_images=False):
+        columns = self.columns[:-1]
+        last_pk = 0
+        while True:
+            recipes = list(self.queryset().filter(
+                pk__gt=last_pk
+            ).values_list(*columns)[:chunk_size])
+            if not recipes:
+                return
+            last_pk = recipes[-1][0]
+            ingredients = {}
+            for recipe_id, ingredient_id, amount in (
+                RecipeIngredient.objects.filter(
+                    recipe_id__in=[recipe[0] for recipe in recipes]
+                ).order_by('pk').values_list(
+                    'recipe_id', 'ingredient_id', 'amount'
+                )
+            ):
+                ingredients.setdefault(recipe_id, []).append(
+                    {'id': ingredient_id, 'amount': amount}
+                )
+            for values in recipes:
+                row = dict(zip(columns, values))
+                row['ingredients'] = ingredients.get(row['id'], [])
+                if embed_images and row['image']:
+                    row['image'] = data_uri(row['image'])
+                yield row
+
+
+class FavoriteDataset(Dataset):
+    name = 'favorites'
+    model = Favorite
+    columns = ('user_id', 'recipe_id', 'created_at')
+
+
+class ShoppingCartDataset(Dataset):
+    name = 'shopping_cart'
+    model = ShoppingCart
+    columns = ('user_id', 'recipe_id', 'created_at')
+
+
+class SubscriptionDataset(Dataset):
+    name = 'subscriptions'
+    model = Subscription
+    columns = ('user_id', 'author_id')
+
+
+DATASETS = {
+    dataset.name: dataset
+    for dataset in (
+        IngredientDataset(),
+        UserDataset(),
+        RecipeDataset(),
+        FavoriteDataset(),
+        ShoppingCartDataset(),
+        SubscriptionDataset(),
+    )
+}
+
+
+def import_file(dataset, path, format=None, batch_size=5000,
+                use_copy=None, restart=False, progress=None):
+    format = detect_format(path, format)
+    if use_copy is None:
+        use_copy = connection.vendor == 'postgresql'
+    writer = CopyWriter() if use_copy else BulkCreateWriter()
+    checkpoint = Checkpoint(path, dataset.name)
+    done = 0 if restart else checkpoint.load()
+    rows = islice(read_rows(path, format, dataset.columns), done, None)
+    started = time.monotonic()
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        with transaction.atomic():
+            dataset.import_batch(writer, batch)
+        done += len(batch)
+        checkpoint.save(done)
+        if progress is not None:
+            progress(done, time.monotonic() - started)
+    dataset.finish()
+    checkpoint.clear()
+    return done
+
+
+def sync_ingredients(path, format=None, batch_size=1000, dry_run=False):
+    # Справочник сравнивается с таблицей по названию за один проход:
+    # в базу уходят только новые ингредиенты и сменившиеся единицы.
+    format = detect_format(path, format)
+    current = dict(
+        Ingredient.objects.values_list('name', 'measurement_unit')
+    )
+    seen = set()
+    changes = []
+    summary = {'created': 0, 'updated': 0, 'unchanged': 0, 'missing': 0}
+    for row in read_rows(path, format, IngredientDataset.columns):
+        name = row['name'].strip()
+        measurement_unit = row['measurement_unit'].strip()
+        if name in seen:
+            continue
+        seen.add(name)
+        if name not in current:
+            summary['created'] += 1
+        elif current[name] != measurement_unit:
+            summary['updated'] += 1
+        else:
+            summary['unchanged'] += 1
+            continue
+        changes.append(
+            Ingredient(name=name, measurement_unit=measurement_unit)
+        )
+    summary['missing'] = len(current.keys() - seen)
+    if changes and not dry_run:
+        with transaction.atomic():
+            Ingredient.objects.bulk_create(
+                changes,
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=['name'],
+                update_fields=['measurement_unit']
+            )
+        bump_version(INGREDIENTS_VERSION)
+    return summary
+
+
+def export_file(dataset, path, format=None, chunk_size=5000,
+                embed_images=False, progress=None):
+    format = detect_format(path, format, WRITE_FORMATS)
+    started = time.monotonic()
+    done = 0
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        if format == 'csv':
+            writer = csv.DictWriter(file, fieldnames=dataset.columns)
+            writer.writeheader()
+        for row in dataset.export_rows(chunk_size, embed_images):
+            if format == 'csv':
+                writer.writerow({
+                    key: json.dumps(value) if isinstance(value, list)
+                    else value.isoformat() if isinstance(value, datetime)
+                    else value
+                    for key, value in row.items()
+                })
+            else:
+                file.write(json.dumps(
+                    row,
+                    ensure_ascii=False,
+                    default=lambda value: value.isoformat()
+                ) + '\n')
+            done += 1
+            if progress is not None and not done % chunk_size:
+                progress(done, time.monotonic() - started)
+    if progress is not None:
+        progress(done, time.monotonic() - started)
+    return done
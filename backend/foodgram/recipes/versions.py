@@ -0,0 +1,52 @@
+import time
+
+from django.core.cache import cache
+from django.utils import timezone
+
+INGREDIENTS_VERSION = 'ingredients'
+RECIPES_VERSION = 'recipes'
+POPULARITY_VERSION = 'popularity'
+
+
+def author_recipes_version(author_id):
+    return f'{RECIPES_VERSION}:author:{author_id}'
+
+
+def _version_key(name):
+    return f'version:{name}'
+
+
+def _modified_key(name):
+    return f'version-modified:{name}'
+
+
+def get_version(name):
+    key = _version_key(name)
+    version = cache.get(key)
+    if version is None:
+        # Начальное значение берется от времени, чтобы после вытеснения
+        # ключа из кэша счетчик не повторил уже выданные версии.
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def get_modified(name):
+    key = _modified_key(name)
+    modified = cache.get(key)
+    if modified is None:
+        cache.add(key, timezone.now(), timeout=None)
+        modified = cache.get(key)
+    return modified
+
+
+def bump_version(name):
+    key = _version_key(name)
+    cache.add(key, time.time_ns(), timeout=None)
+    cache.set(_modified_key(name), timezone.now(), timeout=None)
+    return cache.incr(key)
+
+
+def bump_recipes_version(author_id):
+    bump_version(RECIPES_VERSION)
+    bump_version(author_recipes_version(author_id))
@@ -1,14 +1,15 @@
+from http import HTTPStatus
+
+from django.http import JsonResponse
 from django.shortcuts import redirect
 from .models import Recipe
-from rest_framework.response import Response
-from rest_framework import status
 
 
-def short_link_redirect(request, recipe_id): 
-    recipe_exists = Recipe.objects.filter(id=recipe_id).exists()
-    if recipe_exists:
-        return redirect(f'/recipes/{recipe_id}/')
-    return Response(
+async def short_link_redirect(request, pk):
+    if await Recipe.objects.filter(pk=pk).aexists():
+        return redirect(f'/recipes/{pk}/')
+    return JsonResponse(
         {'error': 'Рецепт не существует!'},
-        status=status.HTTP_400_BAD_REQUEST
+        status=HTTPStatus.NOT_FOUND,
+        json_dumps_params={'ensure_ascii': False}
     )